@@ -1,14 +1,35 @@
-from setting import Dflow_chunks_queue_limit , chunk_size
+from setting import Dflow_chunks_queue_limit , chunk_size, result_cache_max_bytes, adaptive_target_seconds, workers, spill_threshold_bytes
 import json
 import os
 from datetime import datetime
-from typing import List, Optional, Dict
+from typing import Callable, List, Optional, Dict, Union
 from flexibleChunkReader import FlexibleChunkReader
+from multiFileReader import MultiFileChunkReader, source_exists
 from chunklist import Chunk
+from columnarCsv import json_default
+from resultCache import ResultCache, get_script_hash
+from dflowRegistry import DFlowRegistry
+from storage import Storage, get_storage, write_blob
+from scheduler import FairShareScheduler
+from metrics import CHUNK_EXEC_SECONDS, CHUNK_SPLITS, CHUNKS_TOTAL, QUEUE_DEPTH, SPECULATIVE_TOTAL, CHUNK_RETRIES
+from speculation import StragglerMonitor, RetryPolicy
+from concurrent.futures import Executor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import deque
+from chunkProfiler import ChunkProfiler, PROFILERS
+from contextlib import nullcontext
+from adaptiveSizing import AdaptiveChunkSizer
+from memoryGovernor import GOVERNOR, MemoryLimitExceeded, SpillingSink, SpilledOutput
+import time
 import random
-from functions import is_file_in_my_disk
+import threading
+from functions import is_file_in_my_disk, is_file_appended
 from tqdm import tqdm
-import sqlite3
+
+DEFAULT_SCRIPT = '''from tqdm import tqdm\nfinal=0\nfor input in tqdm(range(len(inputs))):\n final = inputs[input]\n output.append(final)'''
+# governed inputs are a generator: iterate, no len() or indexing
+GOVERNED_SCRIPT = '''from tqdm import tqdm\nfor input in tqdm(inputs):\n output.append(input)'''
+# columnar inputs are a dict of columns: rows are zipped from them
+COLUMNAR_SCRIPT = '''from tqdm import tqdm\nfor row in tqdm(zip(*inputs.values())):\n output.append(dict(zip(inputs, row)))'''
 
 
 class DFlow:
@@ -16,34 +37,92 @@ class DFlow:
     def __init__(self, filepath: str, file_hash: str, 
                  total_chunks: int, chunk_size: int,
                  mode: str = 'line', delimiter: str = '\n',
+                 chunking: str = 'fixed', avg_chunk_bytes: int = 0,
+                 adaptive: bool = False, target_seconds: tuple = adaptive_target_seconds,
+                 governed: bool = False,
                  metadata: Optional[Dict] = None,
                  fileHandle: FlexibleChunkReader | None = None,
-                 script:str = 
-                 '''from tqdm import tqdm\nfinal=0\nfor input in tqdm(range(len(inputs))):\n final = inputs[input]\n output.append(final)'''
+                 script: Optional[str] = None,
+                 open_reader: Optional[Callable[['DFlow'], None]] = None
                  ):
-        self.fileHandle=fileHandle
+        self._fileHandle = fileHandle
+        self._open_reader = open_reader  # builds fileHandle on first use
         self.filepath = filepath
         self.file_hash = file_hash
         self.total_chunks = total_chunks
         self.chunk_size = chunk_size
         self.mode = mode
         self.delimiter = delimiter
+        self.chunking = chunking
+        self.avg_chunk_bytes = avg_chunk_bytes
+        # adaptive: chunks are work units of measured size, see work_units table
+        self.adaptive = adaptive
+        self.target_seconds = tuple(target_seconds)
+        self._sizer: AdaptiveChunkSizer | None = None
+        # governed: inputs streamed, output spilled, chunks split over the memory limit
+        self.governed = governed
         self.added_at = datetime.now().isoformat()
         self.metadata = metadata or {}
+        if script is None or script == DEFAULT_SCRIPT:
+            # DFlows saved with the old default get the one of their kind
+            script = GOVERNED_SCRIPT if governed else COLUMNAR_SCRIPT if mode == 'columnar' else DEFAULT_SCRIPT
         self.script = script
         self.chunks_queue_limit = Dflow_chunks_queue_limit
+        self.result_cache: ResultCache | None = None  # shared, set by DFlowManager
+        self._script_hash = None
+        self.stats = {'cache_hits': 0, 'cache_misses': 0, 'executed': 0, 'failed': 0,
+                      'speculated': 0, 'speculative_wins': 0, 'retried': 0, 'split': 0}
+        self.profiler: ChunkProfiler | None = None
+        self._stop = threading.Event()
+
+        # opened on first use, so loading many DFlows stays cheap
+        self._db = None
+        self._unused_chunck_list = None
+
+    @property
+    def fileHandle(self) -> FlexibleChunkReader | None:
+        if self._fileHandle is None and self._open_reader is not None:
+            open_reader, self._open_reader = self._open_reader, None
+            open_reader(self)
+        return self._fileHandle
+
+    @fileHandle.setter
+    def fileHandle(self, reader: FlexibleChunkReader | None):
+        self._fileHandle = reader
+
+    @property
+    def db(self) -> Storage:
+        if self._db is None:
+            # shared with the reader of the same file, usable from any thread
+            self._db = get_storage(f"{self.file_hash}.db")
+            self.DBcreate_table()
+        return self._db
 
-        print(1111111111112222222222)
-        self.conn = sqlite3.connect(f"{self.file_hash}.db")
-        print(1111111111112222222222333333333333)
-        self.DBcreate_table()
+    @property
+    def unused_chunck_list(self) -> list:
+        if self._unused_chunck_list is None:
+            self.update_unused_chunck_list()
+        return self._unused_chunck_list
 
-        self.unused_chunck_list = []
-        self.update_unused_chunck_list()        
+    @unused_chunck_list.setter
+    def unused_chunck_list(self, value: list):
+        self._unused_chunck_list = value
+
+    @property
+    def is_local(self) -> bool:
+        """the file is (or looked, at load time) on this disk"""
+        return self._fileHandle is not None or self._open_reader is not None
+
+    def attach(self):
+        """build the reader, index and unused chunk set now instead of on first use"""
+        self.fileHandle
+        self.unused_chunck_list
+        return self
 
 
     @classmethod
-    def from_dict(cls, data: dict , fileHandle: FlexibleChunkReader | None = None):
+    def from_dict(cls, data: dict , fileHandle: FlexibleChunkReader | None = None,
+                  open_reader: Optional[Callable[['DFlow'], None]] = None):
         dflow = cls(
             filepath=data['filepath'],
             file_hash=data['file_hash'],
@@ -51,9 +130,15 @@ class DFlow:
             chunk_size=data['chunk_size'],
             mode=data.get('mode', 'line'),
             delimiter=data.get('delimiter', '\n'),
+            chunking=data.get('chunking', 'fixed'),
+            avg_chunk_bytes=data.get('avg_chunk_bytes', 0),
+            adaptive=data.get('adaptive', False),
+            target_seconds=data.get('target_seconds', adaptive_target_seconds),
+            governed=data.get('governed', False),
             metadata=data.get('metadata', {}),
             fileHandle = fileHandle,
-            script = data.get('script', '')
+            script = data.get('script', ''),
+            open_reader = open_reader
         )
         dflow.added_at = data.get('added_at', datetime.now().isoformat())
         return dflow
@@ -66,83 +151,76 @@ class DFlow:
             'chunk_size': self.chunk_size,
             'mode': self.mode,
             'delimiter': self.delimiter,
+            'chunking': self.chunking,
+            'avg_chunk_bytes': self.avg_chunk_bytes,
+            'adaptive': self.adaptive,
+            'target_seconds': list(self.target_seconds),
+            'governed': self.governed,
             'added_at': self.added_at,
             'metadata': self.metadata,
             'script': self.script,
         }
 
     def DBcreate_table(self):
-        cur = self.conn.cursor()
-        try:
-            cur.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name=?;", 
-                ('chunks',)
-            )
-            if cur.fetchone() is None: 
-                cur.execute("""
-                CREATE TABLE chunks (
-                    chunk_index INTEGER PRIMARY KEY,
-                    content BLOB NOT NULL,
-                    result BLOB NOT NULL,
-                    status INTEGER NOT NULL DEFAULT 0
-                );
-                """)
-                self.conn.commit()
-        finally:
-            cur.close()
+        def create(cur):
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_index INTEGER PRIMARY KEY,
+                content BLOB NOT NULL,
+                result BLOB NOT NULL,
+                status INTEGER NOT NULL DEFAULT 0
+            );
+            """)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS work_units (
+                unit_id INTEGER PRIMARY KEY,
+                start INTEGER NOT NULL,
+                end INTEGER NOT NULL
+            );
+            """)
+        self._db.transaction(create)
 
     def get_chunks_queue(self):
-        cur = self.conn.cursor()
-        try:
-            cur.execute(
-                "select chunk_index from chunks where status=0 order by chunk_index"
-                )
-            rows = cur.fetchall()
-            out = []
-            for row in rows:
-                out.append(row[0])
-            return out
-        
-        finally:
-            cur.close()    
+        rows = self.db.query("select chunk_index from chunks where status=0 order by chunk_index")
+        out = [row[0] for row in rows]
+        QUEUE_DEPTH.set(len(out), dflow=self.file_hash[:8])
+        return out
             
+    def get_error_queue(self):
+        rows = self.db.query("select chunk_index from chunks where status=2 order by chunk_index")
+        return [row[0] for row in rows]
+
     def get_finished_queue(self):
-        cur = self.conn.cursor()
-        try:
-            cur.execute(
-                "select chunk_index from chunks where status=1 order by chunk_index"
-                )
-            rows = cur.fetchall()
-            out = []
-            for row in rows:
-                out.append(row[0])
-            return out
-        
-        finally:
-            cur.close()
+        rows = self.db.query("select chunk_index from chunks where status=1 order by chunk_index")
+        return [row[0] for row in rows]
 
     def set_chunk_finished(self, chunk_index, result):
-        cur = self.conn.cursor()
-        result_blob = json.dumps(result).encode("utf-8")
-        try:
-            cur.execute(
-                "UPDATE chunks SET status=1 ,result=? WHERE chunk_index = ?;", (result_blob,chunk_index)
-                )
-            self.conn.commit()
-        
-        finally:
-            cur.close()    
+        if isinstance(result, SpilledOutput):
+            # governed output is streamed from its spill files into the row, then released
+            def store(cur):
+                cur.execute("UPDATE chunks SET status=1 ,result=zeroblob(?) WHERE chunk_index = ?;",
+                            (result.size, chunk_index))
+                if cur.rowcount:
+                    write_blob(cur, 'chunks', 'result', chunk_index, result.write_to)
+            try:
+                self.db.transaction(store)
+            finally:
+                result.close()
+            CHUNKS_TOTAL.inc(dflow=self.file_hash[:8], status='finished')
+            return
+        # queued, committed with the other workers' updates by the writer thread
+        if not isinstance(result, bytes):  # governed cache hits come encoded
+            result = json.dumps(result, default=json_default).encode("utf-8")
+        self.db.execute("UPDATE chunks SET status=1 ,result=? WHERE chunk_index = ?;", (result, chunk_index))
+        CHUNKS_TOTAL.inc(dflow=self.file_hash[:8], status='finished')
             
     def set_chunk_error(self, chunk_index):
-        cur = self.conn.cursor()
-        try:
-            cur.execute(
-                "UPDATE chunks SET status=2 WHERE chunk_index = ?;", (chunk_index,)
-                )
-            self.conn.commit()
-        
-        finally:
-            cur.close()
+        self.db.execute("UPDATE chunks SET status=2 WHERE chunk_index = ?;", (chunk_index,))
+        CHUNKS_TOTAL.inc(dflow=self.file_hash[:8], status='error')
+
+    def reset_chunk(self, chunk_index):
+        """put a chunk back to pending, e.g. to retry it after an error"""
+        self.db.execute("UPDATE chunks SET status=0 WHERE chunk_index = ?;", (chunk_index,))
 
 
 
@@ -151,14 +229,10 @@ class DFlow:
             chunks_queue = self.get_chunks_queue()
             try:
                 for chunk_index in chunks_queue:
-                    chunk_data = self.fileHandle.read_items(chunk_index)
-                    chunk = Chunk(chunk_index, chunk_data)
-                    if(self.run_over_chunk(chunk)):
-                        self.set_chunk_finished(chunk_index, chunk.result)
+                    if(self.run_chunk(chunk_index)):
                         self.get_new_chunks()
                         break
                     else:
-                        self.set_chunk_finished(chunk_index)
                         self.get_new_chunks()
 
             except Exception as e:
@@ -174,9 +248,12 @@ class DFlow:
                 break
 
     def get_new_chunks(self):
+        if self.adaptive:
+            return self._new_work_unit()
         index = self.get_random_unused_chunck()
         if(self.fileHandle):
-            chunk_data = self.fileHandle.read_items(index)
+            # governed chunks are only read by the worker that runs them
+            chunk_data = [] if self.governed else self.fileHandle.read_items(index)
             chunk = Chunk(index, chunk_data)
             self.add_to_chunks_queue(chunk)
             self.unused_chunck_list.remove(index)
@@ -187,31 +264,352 @@ class DFlow:
 
     def add_to_chunks_queue(self, chunk:Chunk):
         chunks_queue = self.get_chunks_queue()
-        print(len(chunks_queue))
         if(len(chunks_queue) > self.chunks_queue_limit):return
         
-        content_blob = json.dumps(chunk.content).encode("utf-8")
+        content_blob = json.dumps(chunk.content, default=json_default).encode("utf-8")
         result_blob = json.dumps([]).encode("utf-8")  # empty result
-        cur = self.conn.cursor()
+        self.db.execute(
+            """
+            INSERT INTO chunks (chunk_index, content, result, status)
+            VALUES (?, ?, ?, 0)
+            """,
+            (chunk.index, content_blob, result_blob)
+        )
+        QUEUE_DEPTH.set(len(chunks_queue) + 1, dflow=self.file_hash[:8])
+    
+    def run_chunk(self, chunk_index) -> bool:
+        """read, run and persist one chunk"""
+        profiler = self.profiler
+        with profiler.chunk(chunk_index) if profiler else nullcontext():
+            with self._phase('read'):
+                chunk = self._read_chunk(chunk_index)
+            with self._phase('exec'):
+                executed = self.stats['executed']
+                start = time.perf_counter()
+                done = self.process_chunk(chunk)
+                if self.adaptive and self.stats['executed'] > executed:
+                    self._observe_work_unit(chunk_index, time.perf_counter() - start)
+            with self._phase('db'):
+                if done:
+                    self.set_chunk_finished(chunk_index, chunk.result)
+                else:
+                    self.set_chunk_error(chunk_index)
+        return done
+
+    def read_chunk_items(self, chunk_index) -> list:
+        if self.adaptive:
+            start, end = self.get_work_unit(chunk_index)
+            return self.fileHandle.read_items_range(start, end)
+        return self.fileHandle.read_items(chunk_index)
+
+    def _unit_range(self, chunk_index) -> tuple:
+        """[start, end) of a chunk in reader units"""
+        if self.adaptive:
+            return self.get_work_unit(chunk_index)
+        return self.fileHandle.chunk_range(chunk_index)
+
+    def _read_chunk(self, chunk_index) -> Chunk:
+        if self.governed:
+            # only hashed here, block by block; the worker streams the items
+            return Chunk(chunk_index, None, self.fileHandle.range_hash(*self._unit_range(chunk_index)))
+        return Chunk(chunk_index, self.read_chunk_items(chunk_index))
+
+    # ---- adaptive work units ----
+
+    @property
+    def sizer(self) -> AdaptiveChunkSizer:
+        if self._sizer is None:
+            # continue from the last unit size instead of warming up from chunk_size again
+            row = self.db.query_one("SELECT end - start FROM work_units ORDER BY unit_id DESC LIMIT 1")
+            self._sizer = AdaptiveChunkSizer(row[0] if row else self.chunk_size, self.target_seconds)
+        return self._sizer
+
+    def get_work_unit(self, unit_id) -> tuple:
+        row = self.db.query_one("SELECT start, end FROM work_units WHERE unit_id = ?", (unit_id,))
+        if row is None:
+            raise ValueError(f"Unknown work unit {unit_id}")
+        return row
+
+    def _new_work_unit(self):
+        """cut the next unit, sized by the sizer, from where the last one ended"""
+        if not self.fileHandle:
+            return
+        if len(self.get_chunks_queue()) > self.chunks_queue_limit:
+            return
+        total_units = self.fileHandle.total_units
+        next_size = self.sizer.next_size()
+
+        def cut(cur):
+            cur.execute("SELECT COALESCE(MAX(end), 0), COALESCE(MAX(unit_id), -1) FROM work_units")
+            cursor, last_id = cur.fetchone()
+            if cursor >= total_units:
+                raise ValueError("No available index in the given range")
+            end = min(cursor + next_size, total_units)
+            cur.execute("INSERT INTO work_units (unit_id, start, end) VALUES (?, ?, ?)", (last_id + 1, cursor, end))
+            return cursor, end, last_id
+        cursor, end, last_id = self.db.transaction(cut)
+        content = [] if self.governed else self.fileHandle.read_items_range(cursor, end)
+        self.add_to_chunks_queue(Chunk(last_id + 1, content))
+
+    def _drop_stale_work_units(self, stale_start: int):
+        """drop the units reaching past `stale_start`, the cursor moves back and they are cut again"""
+        def drop(cur):
+            cur.execute("DELETE FROM chunks WHERE chunk_index IN (SELECT unit_id FROM work_units WHERE end > ?)",
+                        (stale_start,))
+            cur.execute("DELETE FROM work_units WHERE end > ?", (stale_start,))
+        self.db.transaction(drop)
+
+    def _units_left(self) -> bool:
+        """the work units cut so far end before the file does"""
+        row = self.db.query_one("SELECT COALESCE(MAX(end), 0) FROM work_units")
+        return row[0] < self.fileHandle.total_units
+
+    def _observe_work_unit(self, unit_id, seconds: float, running=()) -> bool:
+        """feed the sizer; True if the queued units were replanned"""
+        start, end = self.get_work_unit(unit_id)
+        was_calibrated = self.sizer.calibrated
+        self.sizer.observe(end - start, seconds)
+        if self.sizer.calibrated and not was_calibrated:
+            self._replan_pending_units([unit_id, *running])
+            return True
+        return False
+
+    def _replan_pending_units(self, running_units):
+        """drop queued units cut before the size was known, they are cut again on refill"""
+        running_units = list(running_units)
+
+        def replan(cur):
+            cur.execute(f"""
+                SELECT COALESCE(MAX(w.end), 0) FROM work_units w
+                JOIN chunks c ON c.chunk_index = w.unit_id
+                WHERE c.status != 0 OR w.unit_id IN ({','.join('?' * len(running_units))})
+            """, running_units)
+            started_end = cur.fetchone()[0]
+            cur.execute("""
+                DELETE FROM chunks WHERE status = 0 AND chunk_index IN
+                (SELECT unit_id FROM work_units WHERE start >= ?)
+            """, (started_end,))
+            cur.execute("DELETE FROM work_units WHERE start >= ?", (started_end,))
+        self.db.transaction(replan)
+
+    def _phase(self, name: str):
+        return self.profiler.phase(name) if self.profiler else nullcontext()
+
+    def _record_phase(self, chunk_index, name: str, start: float):
+        """a phase run_parallel ran on the coordinator, from `start` until now"""
+        if self.profiler:
+            self.profiler.record_phase(chunk_index, name, time.perf_counter() - start)
+
+    def enable_profiling(self, every_n: int = 10) -> ChunkProfiler:
+        """time every chunk, cProfile + peak memory for every Nth one"""
+        self.profiler = ChunkProfiler(every_n)
+        PROFILERS[self.file_hash] = self.profiler
+        return self.profiler
+
+    def disable_profiling(self) -> ChunkProfiler | None:
+        profiler, self.profiler = self.profiler, None
+        PROFILERS.pop(self.file_hash, None)
+        return profiler
+
+    @property
+    def script_hash(self) -> str:
+        if self._script_hash is None:
+            self._script_hash = get_script_hash(self.script)
+        return self._script_hash
+
+    def process_chunk(self, chunk:Chunk):
+        """run the script over a chunk unless the cache already has its result"""
+        cached = self._cached_result(chunk)
+        if cached is not None:
+            chunk.result = cached
+            return True
+
+        if not self._execute(chunk):
+            self.stats['failed'] += 1
+            return False
+        self._store_result(chunk)
+        return True
+
+    def _execute(self, chunk:Chunk) -> bool:
+        return self.run_governed(chunk) if self.governed else self.run_over_chunk(chunk)
+
+    def _cached_result(self, chunk:Chunk) -> Union[list, bytes, None]:
+        if self.result_cache is None:
+            return None
+        cached = self.result_cache.get(chunk.hash, self.script_hash, raw=self.governed)
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+        else:
+            self.stats['cache_misses'] += 1
+        return cached
+
+    def _store_result(self, chunk:Chunk):
+        self.stats['executed'] += 1
+        if self.result_cache is not None:
+            self.result_cache.put(chunk.hash, self.script_hash, chunk.result)
+
+    def run_parallel(self, workers: int = workers, speculate: bool = True,
+                     tail_threshold: Optional[int] = None,
+                     retry: Optional[RetryPolicy] = None,
+                     executor: Optional[Executor] = None,
+                     poll: float = 0.2):
+        """
+        run the DFlow on a pool of workers until no work is left.
+        Reads, cache lookups and DB writes stay on this thread; workers
+        only run the script. When at most `tail_threshold` chunks are left,
+        chunks running past the straggler deadline get a duplicate attempt
+        and the first result wins. Error chunks are retried with backoff.
+        `executor` can be any concurrent.futures executor, e.g. one that
+        sends chunks to peers, or a FairShareScheduler slot. stop() ends
+        the run once the chunks in flight are done.
+        """
+        if not self.fileHandle:
+            print("❌ File is not on this node")
+            return
+        self._stop.clear()
+        monitor = StragglerMonitor()
+        retry = retry or RetryPolicy()
+        tail_threshold = workers * 2 if tail_threshold is None else tail_threshold
+        pool = executor or ThreadPoolExecutor(max_workers=workers)
+        attempts = {}   # future -> chunk_index, including duplicates
+        duplicates = set()
+        running = {}    # chunk_index -> Chunk, until its first result
+        ready = deque()
+        exhausted = False
+        for chunk_index in self.get_error_queue():
+            retry.schedule(chunk_index)
+
         try:
-            cur.execute(
-                """
-                INSERT INTO chunks (chunk_index, content, result, status)
-                VALUES (?, ?, ?, 0)
-                """,
-                (chunk.index, content_blob, result_blob)
-            )
-            self.conn.commit()
+            while True:
+                if self._stop.is_set() and not exhausted:
+                    # let running chunks finish, queued and retried ones wait for the next start
+                    exhausted = True
+                    ready.clear()
+                    retry.due.clear()
+
+                if not exhausted and len(ready) < workers:
+                    try:
+                        self.fill_chunks_queue()
+                    except ValueError:
+                        exhausted = True
+                    known = set(ready) | set(running)
+                    ready.extend(i for i in self.get_chunks_queue() if i not in known)
+
+                for chunk_index in retry.ready():
+                    self.reset_chunk(chunk_index)
+                    self.stats['retried'] += 1
+                    CHUNK_RETRIES.inc(dflow=self.file_hash[:8])
+                    ready.append(chunk_index)
+
+                while ready and len(attempts) < workers:
+                    chunk_index = ready.popleft()
+                    start = time.perf_counter()
+                    chunk = self._read_chunk(chunk_index)
+                    self._record_phase(chunk_index, 'read', start)
+                    start = time.perf_counter()
+                    cached = self._cached_result(chunk)
+                    if cached is not None:
+                        self.set_chunk_finished(chunk_index, cached)
+                        self._record_phase(chunk_index, 'db', start)
+                        continue
+                    running[chunk_index] = chunk
+                    monitor.start(chunk_index)
+                    attempts[pool.submit(self._attempt, chunk)] = chunk_index
+
+                remaining = len(ready) + len(running) + (0 if exhausted else len(self.unused_chunck_list))
+                if speculate and remaining <= tail_threshold and not (self.adaptive and not exhausted):
+                    for chunk_index in monitor.stragglers():
+                        if len(attempts) >= workers:
+                            break
+                        monitor.mark_duplicated(chunk_index)
+                        future = pool.submit(self._attempt, Chunk(chunk_index, running[chunk_index].content))
+                        attempts[future] = chunk_index
+                        duplicates.add(future)
+                        self.stats['speculated'] += 1
+                        SPECULATIVE_TOTAL.inc(outcome='launched')
+
+                if not any(i in running for i in attempts.values()):
+                    # only abandoned losers (if any) are left running
+                    if ready or not exhausted:
+                        continue  # e.g. a refill that was all cache hits
+                    due_in = retry.next_due_in()
+                    if due_in is None:
+                        if self.adaptive and not self._stop.is_set() and self._units_left():
+                            exhausted = False  # e.g. a replan after the file was all cut
+                            continue
+                        break
+                    time.sleep(min(due_in, poll))
+                    continue
+
+                done, _ = wait(attempts, timeout=poll, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk_index = attempts.pop(future)
+                    is_duplicate = future in duplicates
+                    duplicates.discard(future)
+                    if chunk_index not in running or future.cancelled():
+                        continue  # another attempt already won
+                    try:
+                        ok, result, seconds = future.result()
+                    except Exception as e:
+                        print(f"Chunck failed: {e}")
+                        ok, result, seconds = False, None, None
+                    others = [f for f, i in attempts.items() if i == chunk_index]
+
+                    if ok:
+                        chunk = running.pop(chunk_index)
+                        chunk.result = result
+                        start = time.perf_counter()
+                        self._store_result(chunk)
+                        self.set_chunk_finished(chunk_index, result)
+                        self._record_phase(chunk_index, 'db', start)
+                        monitor.finish(chunk_index, seconds)
+                        if self.adaptive and self._observe_work_unit(chunk_index, seconds, running):
+                            # replanned units left the queue, they are cut again on refill
+                            pending = set(self.get_chunks_queue())
+                            ready = deque(i for i in ready if i in pending)
+                            exhausted = self._stop.is_set()
+                        if is_duplicate:
+                            self.stats['speculative_wins'] += 1
+                            SPECULATIVE_TOTAL.inc(outcome='won')
+                        for other in others:
+                            other.cancel()  # a running loser finishes, its result is ignored
+                    elif not others:
+                        running.pop(chunk_index)
+                        monitor.finish(chunk_index)
+                        self.stats['failed'] += 1
+                        start = time.perf_counter()
+                        self.set_chunk_error(chunk_index)
+                        self._record_phase(chunk_index, 'db', start)
+                        if not retry.schedule(chunk_index):
+                            print(f"❌ chunk {chunk_index} failed {retry.max_retries + 1} times, giving up")
         finally:
-            cur.close()
-    
+            if executor is None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def stop_requested(self) -> bool:
+        return self._stop.is_set()
+
+    def _attempt(self, chunk:Chunk):
+        """one worker-side run of the script: (ok, result, seconds)"""
+        start = time.perf_counter()
+        profiler = self.profiler
+        with profiler.chunk(chunk.index) if profiler else nullcontext():
+            with self._phase('exec'):
+                ok = self._execute(chunk)
+        return ok, chunk.result, time.perf_counter() - start
+
     def run_over_chunk(self, chunk:Chunk):
         inputs = chunk.content
         output = []
 
         print(f"Chunk {chunk.index} running ...")
         try:
-            exec(self.script)
+            with CHUNK_EXEC_SECONDS.time(dflow=self.file_hash[:8]):
+                exec(self.script)
         except Exception as e:
 
             print(f"Chunck failed: {e} {self.script}")
@@ -221,25 +619,101 @@ class DFlow:
         chunk.result = output
         return True
 
-    def update_unused_chunck_list(self):
-
-        existing_indexes = set()
-        cur = self.conn.cursor()
+    def run_governed(self, chunk:Chunk) -> bool:
+        """
+        run_over_chunk with bounded memory: `inputs` is a generator over
+        the file (iterate it, no len() or indexing), `output` a
+        SpillingSink. A part that goes over the worker memory limit is
+        split in two halves, each run on its own, and the result is a
+        SpilledOutput of the parts in order, streamed into the DB later.
+        """
+        print(f"Chunk {chunk.index} running ...")
+        parts = []
+        done = False
         try:
-            cur.execute(
-                "select chunk_index from chunks"
-                )
-            rows = cur.fetchall()
-            for row in rows:
-                existing_indexes.add(row[0])
+            done = self._run_part(chunk.index, *self._unit_range(chunk.index), parts)
         finally:
-            cur.close()
+            if not done:
+                for sink in parts:
+                    sink.close()
+        if not done:
+            return False
+        chunk.result = SpilledOutput(parts)
+        print(f'chunck {chunk.index} done')
+        return True
+
+    def _run_part(self, chunk_index, start: int, end: int, parts: list) -> bool:
+        reader = self.fileHandle
+        bytes_per_item = 1 if self.mode == 'byte' else reader.data_size / max(reader.total_items, 1)
+        with GOVERNOR.budget() as budget:
+            output = SpillingSink(spill_threshold_bytes, budget)
+            # the script's variables live here, so they can be dropped before a split
+            scope = {'inputs': budget.track(reader.iter_items_range(start, end), bytes_per_item),
+                     'output': output}
+            try:
+                with CHUNK_EXEC_SECONDS.time(dflow=self.file_hash[:8]):
+                    exec(self.script, globals(), scope)
+            except MemoryLimitExceeded as e:
+                scope.clear()
+                output.close()
+                middle = reader.split_range(start, end)
+                if not start < middle < end:
+                    print(f"Chunck failed: {e}, [{start}, {end}) can not be split")
+                    return False
+                print(f"✂️  chunk {chunk_index} [{start}, {end}) split: {e}")
+                CHUNK_SPLITS.inc(dflow=self.file_hash[:8])
+                self.stats['split'] += 1
+            except Exception as e:
+                output.close()
+                print(f"Chunck failed: {e} {self.script}")
+                return False
+            else:
+                parts.append(output)
+                return True
+            finally:
+                scope.clear()
+        # run the halves after the budget is released
+        return (self._run_part(chunk_index, start, middle, parts)
+                and self._run_part(chunk_index, middle, end, parts))
+
+    def update_unused_chunck_list(self):
+        if self.adaptive:
+            # work units are cut in order from a cursor, not picked from a set
+            self.unused_chunck_list = []
+            return
+
+        existing_indexes = {row[0] for row in self.db.query("select chunk_index from chunks")}
 
         all_indexes = set(range(0, self.total_chunks))
         available = list(all_indexes - existing_indexes)
         self.unused_chunck_list = available
 
 
+    def sync_with_reader(self):
+        """pick up chunks appended to the file since the DFlow was indexed"""
+        reader = self.fileHandle
+        if reader.content_hash == self.metadata.get('content_hash', self.file_hash):
+            return False
+
+        # a partial last chunk got new items, its old result no longer covers it
+        if self.adaptive:
+            if reader.stale_chunks:
+                self._drop_stale_work_units(reader.chunk_range(min(reader.stale_chunks))[0])
+        else:
+            self.db.executemany(
+                "DELETE FROM chunks WHERE chunk_index = ?;",
+                [(chunk_index,) for chunk_index in reader.stale_chunks]
+            )
+
+        print(f"📈 DFlow {self.file_hash[:8]} grew: {self.total_chunks} -> {reader.total_chunks} chunks")
+        self.total_chunks = reader.total_chunks
+        self.metadata['file_size'] = reader.file_size
+        self.metadata['total_items'] = reader.total_items
+        self.metadata['content_hash'] = reader.content_hash
+        self.metadata['file_mtime'] = reader.file_mtime
+        self.update_unused_chunck_list()
+        return True
+
     def get_random_unused_chunck(self):
         if not self.unused_chunck_list:
             raise ValueError("No available index in the given range")
@@ -249,40 +723,99 @@ class DFlow:
 
 class DFlowManager:
     
-    def __init__(self, json_file: str = 'dflows.json'):
+    def __init__(self, json_file: str = 'dflows.json', db_file: Optional[str] = None):
+        # json_file is the legacy manifest, imported once into the SQLite registry
         self.json_file = json_file
-        self.dflows: List[DFlow] = []
+        self.db_file = db_file or os.path.splitext(json_file)[0] + '.db'
+        self.registry = DFlowRegistry(self.db_file)
+        self.result_cache = ResultCache(max_bytes=result_cache_max_bytes)
+        self.scheduler = FairShareScheduler(workers)
         self.load()
 
-
+    @property
+    def dflows(self) -> List[DFlow]:
+        return self.registry.values()
 
     def load(self):
-        if os.path.exists(self.json_file):
-            try:
+        try:
+            if os.path.exists(self.json_file):
                 with open(self.json_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    for dflow in data:
-                        if(is_file_in_my_disk(dflow['filepath'], dflow['file_hash'])):
-                            reader = FlexibleChunkReader(dflow['filepath'], items_per_chunk=dflow["chunk_size"], 
-                                 mode=dflow["mode"], delimiter=dflow["delimiter"], total_items=dflow["metadata"]['total_items'])
-                            self.dflows.append(DFlow.from_dict(dflow, reader))
-                        else:
-                            self.dflows.append(DFlow.from_dict(dflow))
-
-                print(f"✅ {len(self.dflows)} DFlow loaded from:{self.json_file}")
-            except Exception as e:
-                print(f"❌ Loading Error: {e}")
-                self.dflows = []
-        else:
-            print(f"ℹ️  file:{self.json_file} an empty list created.")
-            self.dflows = []
+                    if self.registry.import_rows(json.load(f), os.path.abspath(self.json_file)):
+                        print(f"📥 {self.json_file} imported into {self.db_file}")
+
+            for dflow in self.registry.load_rows():
+                # only cheap checks here, readers are built on attach / first use
+                if dflow.get('metadata', {}).get('multi_file'):
+                    local = source_exists(dflow['filepath'])  # shards are listed on open
+                else:
+                    local = os.path.exists(dflow['filepath'])
+                open_reader = self._open_reader if local else None
+                loaded = DFlow.from_dict(dflow, open_reader=open_reader)
+                loaded.result_cache = self.result_cache
+                self.registry.add(loaded, persist=False)
+
+            print(f"✅ {len(self.registry)} DFlow loaded from:{self.db_file}")
+        except Exception as e:
+            print(f"❌ Loading Error: {e}")
+            self.registry.reset()
     
-    def save(self):
+    def _open_reader(self, dflow: DFlow):
+        """build the reader of a loaded DFlow, picking up appends to its file"""
+        metadata = dflow.metadata
+        content_hash = metadata.get('content_hash', dflow.file_hash)
+        if metadata.get('multi_file'):
+            self._open_multi_file_reader(dflow)
+            return
+        try:
+            stat = os.stat(dflow.filepath)
+        except OSError:
+            return
+        # unchanged size and mtime: skip hashing here, the reader hashes anyway
+        unchanged = (stat.st_size == metadata.get('file_size') and 
+                     stat.st_mtime == metadata.get('file_mtime'))
+        if not (unchanged or is_file_in_my_disk(dflow.filepath, content_hash) or 
+                is_file_appended(dflow.filepath, content_hash, metadata.get('file_size', 0))):
+            return
+
+        columnar = metadata.get('columnar', {})
+        reader = FlexibleChunkReader(dflow.filepath, items_per_chunk=dflow.chunk_size, 
+                                     mode=dflow.mode, delimiter=dflow.delimiter, total_items=metadata.get('total_items', 0),
+                                     index_hash=dflow.file_hash, index_size=metadata.get('file_size', 0),
+                                     chunking=dflow.chunking, avg_chunk_bytes=dflow.avg_chunk_bytes,
+                                     columns=columnar.get('columns'), schema=columnar.get('schema'),
+                                     has_header=columnar.get('has_header', True))
+        dflow.fileHandle = reader
+        if reader.hash == dflow.file_hash and dflow.sync_with_reader():
+            self.save(dflow)
+        elif not unchanged and reader.content_hash == content_hash:
+            # touched but same content, remember the new mtime
+            metadata['file_size'] = stat.st_size
+            metadata['file_mtime'] = stat.st_mtime
+            self.save(dflow)
+
+    def _open_multi_file_reader(self, dflow: DFlow):
+        """shards with unchanged size and mtime reuse their index; new shards add chunks"""
+        try:
+            reader = MultiFileChunkReader(dflow.filepath, items_per_chunk=dflow.chunk_size,
+                                          mode=dflow.mode, delimiter=dflow.delimiter,
+                                          index_hash=dflow.file_hash)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
+        if reader.hash != dflow.file_hash:
+            print(f"⚠️  shards of DFlow {dflow.file_hash[:8]} changed, add it again as a new DFlow")
+            return
+        dflow.fileHandle = reader
+        if dflow.sync_with_reader():
+            dflow.metadata['shards'] = len(reader.shards)
+            self.save(dflow)
+
+    def save(self, dflow: Optional[DFlow] = None):
+        """persist one DFlow, or all of them"""
         try:
-            data = [df.to_dict() for df in self.dflows]
-            with open(self.json_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            print(f"💾 {len(self.dflows)} DFlow saved in {self.json_file}")
+            self.registry.save([dflow] if dflow else self.dflows)
+            if dflow is None:
+                print(f"💾 {len(self.registry)} DFlow saved in {self.db_file}")
         except Exception as e:
             print(f"❌ Saving Error: {e}")
     
@@ -292,44 +825,85 @@ class DFlowManager:
             print(f"⚠️  DFlow with hash {dflow.file_hash[:8]} already exist... ")
             return False
         
-        self.dflows.append(dflow)
+        dflow.result_cache = self.result_cache
+        try:
+            self.registry.add(dflow)  # auto-save
+        except Exception as e:
+            print(f"❌ Saving Error: {e}")
+            self.registry.remove(dflow.file_hash)
+            return False
         print(f"✅ DFlow added: {dflow.filepath}")
-        self.save()  # auto-save
         return True
     
     def remove(self, file_hash: str) -> bool:
         """remove base on hash"""
-        initial_len = len(self.dflows)
-        self.dflows = [df for df in self.dflows if df.file_hash != file_hash]
-        
-        if len(self.dflows) < initial_len:
+        if self.registry.remove(file_hash):
             print(f"🗑️  DFlow with hash {file_hash[:8]} deleted...")
-            self.save()
             return True
         
         print(f"⚠️  DFlow with hash {file_hash[:8]} not fonud...")
         return False
     
     def get_by_hash(self, file_hash: str) -> Optional[DFlow]:
-        for df in self.dflows:
-            if df.file_hash == file_hash:
-                return df
-        return None
+        """exact hash, or a unique prefix of one"""
+        dflow = self.registry.by_hash.get(file_hash)
+        if dflow or not file_hash:
+            return dflow
+        found = self.registry.find_prefix(file_hash)
+        if len(found) > 1:
+            print(f"⚠️  hash prefix {file_hash} matches {len(found)} DFlows...")
+            return None
+        return found[0] if found else None
     
     def get_by_filepath(self, filepath: str) -> Optional[DFlow]:
-        for df in self.dflows:
-            if df.filepath == filepath:
-                return df
-        return None
+        return self.registry.by_path.get(filepath)
     
     def list_all(self) -> List[DFlow]:
-        return self.dflows.copy()
-    
+        return self.dflows
+
+    def start(self, dflow: DFlow, priority: float = 1.0, max_concurrency: Optional[int] = None) -> bool:
+        """run a DFlow in the background on the shared worker pool"""
+        if not dflow.is_local:
+            print(f"❌ DFlow {dflow.file_hash[:8]} is not on this node")
+            return False
+        # reader and registry writes happen here, the scheduler thread only runs chunks
+        dflow.attach()
+        if not dflow.fileHandle:
+            print(f"❌ DFlow {dflow.file_hash[:8]} file changed or missing")
+            return False
+        if not self.scheduler.start(dflow, priority, max_concurrency):
+            print(f"⚠️  DFlow {dflow.file_hash[:8]} is already running...")
+            return False
+        print(f"▶️  DFlow {dflow.file_hash[:8]} started (priority {priority:g})")
+        return True
+
+    def start_all(self, priority: float = 1.0) -> int:
+        """start every local DFlow that is not running yet"""
+        running = {job['file_hash'] for job in self.scheduler.status() if job['state'] == 'running'}
+        started = 0
+        for dflow in self.dflows:
+            if dflow.is_local and dflow.file_hash not in running:
+                started += self.start(dflow, priority)
+        return started
+
+    def stop(self, dflow: DFlow):
+        """stop after the chunks in flight, the rest stays queued"""
+        dflow.stop()
+        print(f"⏹️  DFlow {dflow.file_hash[:8]} stopping...")
+
+    def set_priority(self, dflow: DFlow, priority: Optional[float] = None, max_concurrency: Optional[int] = None) -> bool:
+        if not self.scheduler.set_priority(dflow.file_hash, priority, max_concurrency):
+            print(f"⚠️  DFlow {dflow.file_hash[:8]} was never started...")
+            return False
+        return True
+
+    def jobs(self) -> list:
+        return self.scheduler.status()
+
     
     def clear(self):
         """ clear all DFlows"""
-        self.dflows = []
-        self.save()
+        self.registry.clear()
         print("🗑️  All DFlows deleted!")
     
     def get_stats(self) -> dict:
@@ -374,7 +948,11 @@ class DFlowManager:
 
 def add_file_as_dflow(manager: DFlowManager, filepath: str, 
                       items_per_chunk: int = 512, 
-                      mode: str = 'line', delimiter: str = '\n'):
+                      mode: str = 'line', delimiter: str = '\n',
+                      chunking: str = 'fixed', avg_chunk_bytes: int = 0,
+                      adaptive: bool = False, target_seconds: tuple = adaptive_target_seconds,
+                      columns: Optional[list] = None, schema: Optional[dict] = None, has_header: bool = True,
+                      governed: bool = False):
     
     filepath.replace('\\ ', ' ').strip()
     if filepath.startswith('"') and filepath.endswith('"'):
@@ -385,12 +963,25 @@ def add_file_as_dflow(manager: DFlowManager, filepath: str,
     if not os.path.exists(filepath):
         print(f"❌ Not found: {filepath}")
         return None
-    
+    if governed and mode == 'columnar':
+        print("❌ governed DFlows stream items, columnar chunks are parsed whole")
+        return None
 
     reader = FlexibleChunkReader(filepath, items_per_chunk=items_per_chunk, 
-                                 mode=mode, delimiter=delimiter)
+                                 mode=mode, delimiter=delimiter,
+                                 chunking=chunking, avg_chunk_bytes=avg_chunk_bytes,
+                                 columns=columns, schema=schema, has_header=has_header)
     
     info = reader.get_file_info()
+    metadata = {
+        'file_size': info['file_size'],
+        'total_items': info.get('total_items', 0),
+        'content_hash': reader.content_hash,
+        'file_mtime': os.path.getmtime(filepath)
+    }
+    if reader.columnar:
+        # the inferred schema is kept, so every chunk gets the same column types
+        metadata['columnar'] = {**reader.columnar.get_info(), 'has_header': has_header}
     
     dflow = DFlow(
         filepath=filepath,
@@ -399,13 +990,49 @@ def add_file_as_dflow(manager: DFlowManager, filepath: str,
         chunk_size=items_per_chunk,
         mode=mode,
         delimiter=delimiter,
+        chunking=chunking,
+        avg_chunk_bytes=reader.avg_chunk_bytes,
+        adaptive=adaptive,
+        target_seconds=target_seconds,
+        governed=governed,
+        fileHandle=reader,
+        metadata=metadata
+    )
+    
+    if manager.add(dflow):
+        return dflow
+    return None
+
+
+def add_multi_file_dflow(manager: DFlowManager, source: str,
+                         items_per_chunk: int = 512,
+                         mode: str = 'line', delimiter: str = '\n'):
+    """one DFlow over a directory or glob of shard files"""
+    try:
+        reader = MultiFileChunkReader(source, items_per_chunk=items_per_chunk, mode=mode, delimiter=delimiter)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return None
+
+    info = reader.get_file_info()
+    dflow = DFlow(
+        filepath=source,
+        file_hash=info['file_hash'],
+        total_chunks=info['total_chunks'],
+        chunk_size=items_per_chunk,
+        mode=mode,
+        delimiter=delimiter,
         fileHandle=reader,
         metadata={
             'file_size': info['file_size'],
-            'total_items': info.get('total_items', 0)
+            'total_items': info['total_items'],
+            'content_hash': reader.content_hash,
+            'file_mtime': reader.file_mtime,
+            'multi_file': True,
+            'shards': info['shards'],
         }
     )
-    
+
     if manager.add(dflow):
         return dflow
     return None
@@ -0,0 +1,67 @@
+from typing import Optional, Tuple
+
+
+class AdaptiveChunkSizer:
+    """
+    Picks how many items the next work unit gets, so that one unit takes
+    about `target_seconds` to run. The first `warmup` units use the
+    initial size; after that the size follows the measured time per item.
+    """
+
+    def __init__(self, initial_items: int,
+                 target_seconds: Tuple[float, float] = (1.0, 5.0),
+                 min_items: int = 1, max_items: Optional[int] = None,
+                 warmup: int = 3, smoothing: float = 0.3, max_step: float = 4.0):
+        self.initial_items = max(min_items, initial_items)
+        self.target_seconds = target_seconds
+        self.min_items = min_items
+        self.max_items = max_items
+        self.warmup = warmup
+        self.smoothing = smoothing
+        self.max_step = max_step  # largest grow/shrink factor per decision
+        self.observed = 0
+        self.seconds_per_item: Optional[float] = None
+        self.current_items = self.initial_items
+
+    @property
+    def calibrated(self) -> bool:
+        return self.observed >= self.warmup and self.seconds_per_item is not None
+
+    def observe(self, items: int, seconds: float):
+        """record the run time of a unit of `items` items"""
+        if items <= 0:
+            return
+        rate = seconds / items
+        if self.seconds_per_item is None:
+            self.seconds_per_item = rate
+        else:
+            # EWMA, so one odd unit does not swing the size around
+            self.seconds_per_item += self.smoothing * (rate - self.seconds_per_item)
+        self.observed += 1
+
+    def next_size(self) -> int:
+        if not self.calibrated:
+            return self.current_items
+
+        low, high = self.target_seconds
+        expected = self.current_items * self.seconds_per_item
+        if low <= expected <= high:
+            return self.current_items
+
+        target = (low + high) / 2
+        wanted = int(target / self.seconds_per_item) if self.seconds_per_item > 0 else self.current_items * self.max_step
+        wanted = min(max(wanted, int(self.current_items / self.max_step)), int(self.current_items * self.max_step))
+        wanted = max(self.min_items, wanted)
+        if self.max_items:
+            wanted = min(wanted, self.max_items)
+        self.current_items = max(1, wanted)
+        return self.current_items
+
+    def get_info(self) -> dict:
+        return {
+            'items_per_unit': self.current_items,
+            'seconds_per_item': self.seconds_per_item,
+            'observed_units': self.observed,
+            'calibrated': self.calibrated,
+            'target_seconds': list(self.target_seconds),
+        }
@@ -0,0 +1,210 @@
+"""
+Benchmarks for the chunk read -> execute -> persist path and the P2P layer.
+
+    python benchmark.py --size-mb 64 --modes line csv --out bench.json
+
+Results are printed (and optionally written) as JSON so runs of different
+versions can be diffed.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from chunklist import Chunk
+from DFlow import DFlowManager, add_file_as_dflow
+from flexibleChunkReader import FlexibleChunkReader
+from storage import close_storage, close_all_storages
+from p2p_node import P2PNode
+
+WORDS = ['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'eta', 'theta',
+         'iota', 'kappa', 'lambda', 'mu', 'nu', 'xi', 'omicron', 'pi', 'rho']
+
+
+def generate_file(path: str, mode: str, size_bytes: int, seed: int = 0):
+    """write a synthetic input of about `size_bytes` for the given reader mode"""
+    rnd = random.Random(seed)
+    written = 0
+    with open(path, 'wb') as f:
+        if mode == 'byte':
+            while written < size_bytes:
+                block = rnd.randbytes(min(1 << 20, size_bytes - written))
+                f.write(block)
+                written += len(block)
+            return
+        while written < size_bytes:
+            lines = []
+            for _ in range(1024):
+                if mode == 'csv':
+                    lines.append(f"{rnd.randint(0, 10**6)},{rnd.random():.6f},{rnd.choice(WORDS)}\n")
+                elif mode == 'token':
+                    lines.append(' '.join(rnd.choice(WORDS) for _ in range(8)) + ' ')
+                else:
+                    lines.append(f"{rnd.choice(WORDS)}{rnd.randint(0, 10**9)}.example.com\n")
+            block = ''.join(lines).encode('utf-8')
+            f.write(block)
+            written += len(block)
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def _reader(path: str, mode: str, items_per_chunk: int) -> FlexibleChunkReader:
+    delimiter = ' ' if mode == 'token' else '\n'
+    return FlexibleChunkReader(path, items_per_chunk=items_per_chunk, mode=mode, delimiter=delimiter)
+
+
+def bench_reader(results: list, path: str, mode: str, items_per_chunk: int):
+    file_size = os.path.getsize(path)
+
+    seconds, reader = _timed(_reader, path, mode, items_per_chunk)
+    record(results, f'{mode}.index_build', seconds, 's', file_mb=file_size / 2**20)
+    close_storage(f"{reader.hash}.db")  # the load below opens the index again
+
+    seconds, reader = _timed(_reader, path, mode, items_per_chunk)
+    record(results, f'{mode}.index_load', seconds, 's')
+
+    chunks = range(reader.total_chunks)
+    seconds, total = _timed(lambda: sum(len(reader.read_chunk(i)) for i in chunks))
+    record(results, f'{mode}.read_chunk', file_size / 2**20 / seconds, 'MB/s', chunks=reader.total_chunks)
+
+    seconds, total = _timed(lambda: sum(len(reader.read_items(i)) for i in chunks))
+    record(results, f'{mode}.read_items', total / seconds, 'items/s', items=total)
+    return reader
+
+
+def bench_dflow(results: list, path: str, mode: str, items_per_chunk: int):
+    manager = DFlowManager(f'bench_{mode}.json')
+    delimiter = ' ' if mode == 'token' else '\n'
+    dflow = add_file_as_dflow(manager, path, items_per_chunk=items_per_chunk, mode=mode, delimiter=delimiter)
+    if dflow is None:
+        dflow = manager.get_by_filepath(path)
+    dflow.script = 'output.append(len(inputs))'
+
+    def fill():
+        try:
+            dflow.fill_chunks_queue()
+        except ValueError:
+            pass  # fewer chunks than the queue limit
+    seconds, _ = _timed(fill)
+    queued = len(dflow.get_chunks_queue())
+    record(results, f'{mode}.queue_fill', queued / seconds, 'chunks/s', chunks=queued)
+
+    chunks = [Chunk(i, dflow.fileHandle.read_items(i)) for i in dflow.get_chunks_queue()]
+    seconds, _ = _timed(lambda: [dflow.run_over_chunk(c) for c in chunks])
+    record(results, f'{mode}.run_over_chunk', seconds / len(chunks) * 1e6, 'us/chunk')
+
+    def update():
+        for c in chunks:
+            dflow.set_chunk_finished(c.index, c.result)
+        dflow.db.flush()  # writes are queued, count them once committed
+    seconds, _ = _timed(update)
+    record(results, f'{mode}.state_update', len(chunks) / seconds, 'updates/s')
+
+
+def bench_p2p(results: list, nodes: int, payload_kb: int, rounds: int):
+    cluster = [P2PNode() for _ in range(nodes)]
+    for node in cluster:
+        node.nodeLog = False
+        node.start()
+    try:
+        client, server = cluster[0], cluster[-1]
+        peer = f"{server.host}:{server.port}"
+
+        rtts = []
+        for _ in range(rounds):
+            seconds, response = _timed(client._send_message, peer, {'type': 'PEER_PING'})
+            if response:
+                rtts.append(seconds * 1000)
+        if rtts:
+            rtts.sort()
+            record(results, 'p2p.rtt_p50', statistics.median(rtts), 'ms', nodes=nodes, samples=len(rtts))
+            record(results, 'p2p.rtt_p95', rtts[int(len(rtts) * 0.95) - 1], 'ms')
+
+        data = 'x' * (payload_kb * 1024)
+        seconds, _ = _timed(lambda: [client._send_message(peer, {'type': 'STORE_CHUNK', 'hash': f'bench{i}', 'data': data}, 10)
+                                     for i in range(rounds)])
+        record(results, 'p2p.upload', payload_kb * rounds / 1024 / seconds, 'MB/s', payload_kb=payload_kb)
+
+        seconds, _ = _timed(lambda: [client._send_message(peer, {'type': 'GET_CHUNK', 'hash': f'bench{i}'}, 10)
+                                     for i in range(rounds)])
+        record(results, 'p2p.download', payload_kb * rounds / 1024 / seconds, 'MB/s', payload_kb=payload_kb)
+    finally:
+        for node in cluster:
+            node.stop()
+
+
+def record(results: list, name: str, value: float, unit: str, **extra):
+    results.append({'name': name, 'value': round(value, 6), 'unit': unit, **extra})
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                         cwd=os.path.dirname(os.path.abspath(__file__)),
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.now().isoformat(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=float, default=16, help='size of each synthetic input file')
+    parser.add_argument('--modes', nargs='+', default=['line', 'csv', 'token', 'byte'])
+    parser.add_argument('--items-per-chunk', type=int, default=4096)
+    parser.add_argument('--nodes', type=int, default=2, help='local P2P nodes, 0 skips the P2P benchmarks')
+    parser.add_argument('--payload-kb', type=int, default=256)
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='also write the JSON results here')
+    parser.add_argument('--verbose', action='store_true', help='keep the library output')
+    args = parser.parse_args(argv)
+
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='dflow-bench-') as workdir:
+        # readers and DFlows create their databases in the working directory
+        os.chdir(workdir)
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        try:
+            with quiet:
+                for mode in args.modes:
+                    path = os.path.join(workdir, f'input_{mode}.txt')
+                    generate_file(path, mode, int(args.size_mb * 2**20), args.seed)
+                    bench_reader(results, path, mode, args.items_per_chunk)
+                    bench_dflow(results, path, mode, args.items_per_chunk)
+                if args.nodes:
+                    bench_p2p(results, args.nodes, args.payload_kb, args.rounds)
+        finally:
+            close_all_storages()
+            os.chdir(cwd)
+
+    report = {'environment': environment(), 'config': vars(args), 'results': results}
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+    return report
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
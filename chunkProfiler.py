@@ -0,0 +1,204 @@
+import cProfile
+import os
+import platform
+import pstats
+import statistics
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# file_hash -> profiler of that DFlow, read by the PROFILE P2P message
+PROFILERS: Dict[str, 'ChunkProfiler'] = {}
+
+
+class ChunkProfiler:
+    """
+    Opt-in profiling of the per-chunk path (read -> script -> DB write).
+    Every chunk gets phase wall times, every Nth chunk also runs under
+    cProfile and tracemalloc, alone, so its peak memory is its own.
+    Profiles of several chunks, workers or peers are merged into one
+    function table.
+    """
+
+    def __init__(self, every_n: int = 10, outlier_factor: float = 3.0):
+        self.every_n = max(1, every_n)
+        self.outlier_factor = outlier_factor
+        self.seen = 0
+        self.chunks: Dict[str, dict] = {}  # "<source>:<chunk_index>" -> wall, phases, peak
+        # (file, line, func) -> [primitive calls, calls, tottime, cumtime]
+        self.functions: Dict[tuple, list] = {}
+        self.source = f"{platform.node()}-{os.getpid()}"
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._idle = threading.Condition(self._lock)
+        self._in_flight = 0
+        self._sampling = False  # a sampled chunk is running, alone
+        self._owns_tracing = False
+
+    @contextmanager
+    def chunk(self, chunk_index: int):
+        """
+        profile one chunk; the phases inside are timed with phase().
+        tracemalloc sees the whole process, so a sampled chunk runs alone:
+        it waits for the chunks in flight, and others wait for it.
+        """
+        with self._idle:
+            self.seen += 1
+            sampled = self.seen % self.every_n == 1 or self.every_n == 1
+            self._idle.wait_for(lambda: not self._sampling and not (sampled and self._in_flight))
+            self._sampling = sampled
+            self._in_flight += 1
+        record = {'wall': 0.0, 'phases': {}, 'peak_bytes': None, 'sampled': sampled}
+        self._local.record = record
+
+        profile = None
+        base = 0
+        if sampled:
+            profile = cProfile.Profile()
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owns_tracing = True
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            try:
+                profile.enable()
+            except ValueError:
+                profile = None  # another profiler is active in this process
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['wall'] = time.perf_counter() - start
+            if sampled:
+                if profile is not None:
+                    profile.disable()
+                record['peak_bytes'] = max(0, tracemalloc.get_traced_memory()[1] - base)
+                # tracing slows every allocation, keep it off between samples
+                if self._owns_tracing:
+                    tracemalloc.stop()
+                    self._owns_tracing = False
+            with self._idle:
+                self._in_flight -= 1
+                if sampled:
+                    self._sampling = False
+                self._idle.notify_all()
+            self._local.record = None
+            key = f"{self.source}:{chunk_index}"
+            with self._lock:
+                earlier = self.chunks.get(key)
+                if earlier:
+                    # phases the coordinator recorded for this chunk (read, db)
+                    for name, seconds in earlier['phases'].items():
+                        if name not in record['phases']:
+                            record['phases'][name] = seconds
+                            record['wall'] += seconds
+                self.chunks[key] = record
+                if profile is not None:
+                    self._add_stats(pstats.Stats(profile).stats)
+
+    @contextmanager
+    def phase(self, name: str):
+        record = getattr(self._local, 'record', None)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if record is not None:
+                record['phases'][name] = record['phases'].get(name, 0.0) + time.perf_counter() - start
+
+    def record_phase(self, chunk_index: int, name: str, seconds: float):
+        """time of a phase run outside chunk(), e.g. on the coordinator of run_parallel"""
+        key = f"{self.source}:{chunk_index}"
+        with self._lock:
+            record = self.chunks.get(key)
+            if record is None:
+                record = {'wall': 0.0, 'phases': {}, 'peak_bytes': None, 'sampled': False}
+                self.chunks[key] = record
+            record['phases'][name] = record['phases'].get(name, 0.0) + seconds
+            record['wall'] += seconds
+
+    def _add_stats(self, stats: dict):
+        for func, (cc, nc, tt, ct, _callers) in stats.items():
+            row = self.functions.setdefault(func, [0, 0, 0.0, 0.0])
+            row[0] += cc
+            row[1] += nc
+            row[2] += tt
+            row[3] += ct
+
+    # ---- merging across workers / peers ----
+
+    def export(self) -> dict:
+        with self._lock:
+            return {
+                'chunks': dict(self.chunks),
+                'functions': [[*func, *row] for func, row in self.functions.items()],
+            }
+
+    def merge(self, exported: dict):
+        with self._lock:
+            self.chunks.update(exported.get('chunks', {}))
+            for filename, line, name, cc, nc, tt, ct in exported.get('functions', []):
+                row = self.functions.setdefault((filename, line, name), [0, 0, 0.0, 0.0])
+                row[0] += cc
+                row[1] += nc
+                row[2] += tt
+                row[3] += ct
+
+    # ---- report ----
+
+    def outliers(self) -> dict:
+        """chunks far above the median in wall time or peak memory"""
+        records = list(self.chunks.items())
+        out = {'wall': [], 'memory': []}
+        walls = [r['wall'] for _, r in records]
+        if walls:
+            limit = statistics.median(walls) * self.outlier_factor
+            out['wall'] = sorted((k for k, r in records if r['wall'] > limit),
+                                 key=lambda k: -self.chunks[k]['wall'])
+        peaks = [r['peak_bytes'] for _, r in records if r.get('peak_bytes') is not None]
+        if peaks:
+            limit = statistics.median(peaks) * self.outlier_factor
+            out['memory'] = sorted((k for k, r in records if (r.get('peak_bytes') or 0) > limit),
+                                   key=lambda k: -self.chunks[k]['peak_bytes'])
+        return out
+
+    def report(self, top: int = 15) -> str:
+        records = list(self.chunks.values())
+        if not records:
+            return "No profiled chunks yet"
+
+        lines = [f"📊 {len(records)} chunks, {sum(1 for r in records if r['sampled'])} with cProfile"]
+        walls = [r['wall'] for r in records]
+        lines.append(f"   wall: median {statistics.median(walls)*1000:.1f} ms, max {max(walls)*1000:.1f} ms")
+
+        phases = {}
+        for r in records:
+            for name, seconds in r['phases'].items():
+                phases[name] = phases.get(name, 0.0) + seconds
+        total = sum(walls)
+        for name, seconds in sorted(phases.items(), key=lambda p: -p[1]):
+            lines.append(f"   {name:<8} {seconds:8.3f} s  ({seconds / total * 100 if total else 0:.0f}%)")
+
+        peaks = [r['peak_bytes'] for r in records if r.get('peak_bytes') is not None]
+        if peaks:
+            lines.append(f"   peak memory: median {statistics.median(peaks)/2**20:.1f} MB, max {max(peaks)/2**20:.1f} MB")
+
+        outliers = self.outliers()
+        for kind in ('wall', 'memory'):
+            if outliers[kind]:
+                shown = ', '.join(outliers[kind][:10])
+                lines.append(f"⚠️  {kind} outliers (> {self.outlier_factor:g}x median): {shown}")
+
+        if self.functions:
+            lines.append(f"\n{'ncalls':>10} {'tottime':>9} {'cumtime':>9}  function")
+            ranked = sorted(self.functions.items(), key=lambda f: -f[1][3])[:top]
+            for (filename, line, name), (cc, nc, tt, ct) in ranked:
+                where = f"{os.path.basename(filename)}:{line}({name})" if line else name
+                lines.append(f"{nc:>10} {tt:>9.3f} {ct:>9.3f}  {where}")
+        return '\n'.join(lines)
+
+
+def get_profiler(file_hash: str) -> Optional[ChunkProfiler]:
+    return PROFILERS.get(file_hash)
@@ -5,11 +5,19 @@ import mmap
 import shutil
 import hashlib
 import sqlite3
+from columnarCsv import json_default
 
 class Chunk:
-    def __init__(self, index, content:list):
+    def __init__(self, index, content:list, content_hash: str = None):
         self.index = index
         self.content = content
         self.result:list = None
-        # self.hash = hashlib.md5(content.encode('utf-8')).hexdigest()
+        self._hash = content_hash  # given when the content is not in memory
+
+    @property
+    def hash(self) -> str:
+        """hash of the chunk's items, independent of file and position"""
+        if self._hash is None:
+            self._hash = hashlib.md5(json.dumps(self.content, default=json_default).encode('utf-8')).hexdigest()
+        return self._hash
 
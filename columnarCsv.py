@@ -0,0 +1,116 @@
+import csv
+import io
+from array import array
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # typed array.array columns without numpy
+    np = None
+
+TYPES = ('int', 'float', 'str')
+
+
+def _to_float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return float('nan')
+
+
+def split_rows(text: str, sep: str = ',', maxsplit: int = -1) -> List[list]:
+    """rows of a CSV text; quoted fields go through the csv module"""
+    if '"' in text:
+        return [row for row in csv.reader(io.StringIO(text), delimiter=sep) if row]
+    # no quoting: split only as far as the last wanted column
+    return [line.split(sep, maxsplit) for line in text.splitlines() if line]
+
+
+def infer_type(values: List[str]) -> str:
+    filled = [v for v in values if v != '']
+    if not filled:
+        return 'str'
+    try:
+        for v in filled:
+            int(v)
+        return 'int' if len(filled) == len(values) else 'float'
+    except ValueError:
+        pass
+    try:
+        for v in filled:
+            float(v)
+        return 'float'
+    except ValueError:
+        return 'str'
+
+
+class ColumnarCsv:
+    """
+    Parses a whole CSV chunk into columns: int -> array('q'), float ->
+    array('d') (NumPy arrays over the same buffer when NumPy is installed),
+    str -> list. Only the projected columns are converted.
+    """
+
+    def __init__(self, header: List[str], schema: Optional[Dict[str, str]] = None,
+                 columns: Optional[List[str]] = None, sep: str = ','):
+        self.header = header
+        self.sep = sep
+        self.schema = dict(schema or {})
+        unknown = [c for c in (columns or []) + list(self.schema) if c not in header]
+        if unknown:
+            raise ValueError(f"unknown CSV columns: {', '.join(unknown)}")
+        bad = [t for t in self.schema.values() if t not in TYPES]
+        if bad:
+            raise ValueError(f"unknown column types: {', '.join(bad)} (use {', '.join(TYPES)})")
+        self.columns = list(columns) if columns else list(header)
+        self.positions = [header.index(c) for c in self.columns]
+        self.maxsplit = max(self.positions) + 1 if self.positions else 0
+
+    @property
+    def inferred(self) -> bool:
+        return all(c in self.schema for c in self.columns)
+
+    def infer(self, text: str, skip_header: bool = False, sample: int = 1000):
+        """fill the missing column types from the first rows of `text`"""
+        rows = split_rows(text, self.sep, self.maxsplit)[int(skip_header):][:sample]
+        for name, pos in zip(self.columns, self.positions):
+            if name not in self.schema:
+                self.schema[name] = infer_type([row[pos] if pos < len(row) else '' for row in rows])
+
+    def parse(self, text: Optional[str], skip_header: bool = False) -> dict:
+        rows = split_rows(text, self.sep, self.maxsplit) if text else []
+        if skip_header:
+            rows = rows[1:]
+        out = {}
+        for name, pos in zip(self.columns, self.positions):
+            values = [row[pos] if pos < len(row) else '' for row in rows]
+            out[name] = self._convert(values, self.schema.get(name, 'str'))
+        return out
+
+    def _convert(self, values: List[str], kind: str):
+        if kind == 'str':
+            return values
+        column = None
+        if kind == 'int':
+            try:
+                column = array('q', map(int, values))
+            except ValueError:
+                pass  # empty or non-integer cells, fall back to float with nan
+        if column is None:
+            try:
+                column = array('d', map(float, values))
+            except ValueError:
+                column = array('d', map(_to_float, values))
+        if np is not None:
+            return np.frombuffer(column, dtype=np.int64 if column.typecode == 'q' else np.float64)
+        return column
+
+    def get_info(self) -> dict:
+        return {'columns': self.columns, 'schema': self.schema}
+
+
+def json_default(obj):
+    """json.dumps hook for array / NumPy columns and NumPy scalars"""
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,182 @@
+import bisect
+import threading
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstd input needs `pip install zstandard`
+    zstandard = None
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+BLOCK_SIZE = 256 * 1024  # compressed bytes fed per step, bounds restart point spacing
+
+
+def detect_codec(filepath: str) -> Optional[str]:
+    """'gzip', 'zstd' or None for a plain file, from the magic bytes"""
+    with open(filepath, 'rb') as f:
+        head = f.read(4)
+    if head[:2] == GZIP_MAGIC:
+        return 'gzip'
+    if head == ZSTD_MAGIC:
+        return 'zstd'
+    return None
+
+
+def _is_skippable_frame(data: bytes) -> bool:
+    # zstd skippable frames (e.g. the seek table of the seekable format): magic 0x184D2A5?
+    return len(data) >= 4 and data[1:4] == b'\x2a\x4d\x18' and 0x50 <= data[0] <= 0x5f
+
+
+class CompressedInput:
+    """
+    Random access into a gzip or zstd file by uncompressed offset.
+
+    A full pass records a checkpoint at each gzip member / zstd frame start,
+    (compressed offset, uncompressed offset); decoding can restart there.
+    Inside a gzip member the decoder state is also copied every
+    `checkpoint_bytes`, these restart points live in memory only. zstd
+    decoders can not be copied, so a zstd file needs many small frames.
+    """
+
+    def __init__(self, filepath: str, codec: str, checkpoint_bytes: int = 16 * 1024 * 1024):
+        if codec == 'zstd' and zstandard is None:
+            raise ValueError("zstd input needs the zstandard package")
+        self.filepath = filepath
+        self.codec = codec
+        self.checkpoint_bytes = checkpoint_bytes
+        self.checkpoints: List[Tuple[int, int]] = []  # member/frame starts
+        self.snapshots: List[Tuple[int, int, object]] = []  # (compressed, uncompressed, decoder copy)
+        self.data_size = 0
+        self._snapshot_pass_done = False
+        # parallel readers: the rebuild pass refills the lists the lookups bisect
+        self._lock = threading.Lock()
+
+    def _decoder(self):
+        if self.codec == 'gzip':
+            return zlib.decompressobj(wbits=31)
+        return zstandard.ZstdDecompressor().decompressobj()
+
+    def _decode(self, comp_offset: int, data_offset: int, decoder=None,
+                record: bool = False) -> Iterator[Tuple[int, bytes]]:
+        """(uncompressed offset, data) blocks from a restart point to the end of file"""
+        last_snapshot = data_offset
+        with open(self.filepath, 'rb') as f:
+            f.seek(comp_offset)
+            pending = b''
+            at_eof = False
+            while True:
+                if not pending or (decoder is None and len(pending) < 8 and not at_eof):
+                    more = f.read(BLOCK_SIZE)
+                    at_eof = not more
+                    pending += more
+                    if not pending:
+                        return
+
+                if decoder is None:
+                    if self.codec == 'gzip' and pending[0] == 0:
+                        # zero padding after the last member
+                        stripped = pending.lstrip(b'\x00')
+                        comp_offset += len(pending) - len(stripped)
+                        pending = stripped
+                        continue
+                    if self.codec == 'zstd' and _is_skippable_frame(pending) and len(pending) >= 8:
+                        skip = 8 + int.from_bytes(pending[4:8], 'little')
+                        comp_offset += skip
+                        if skip <= len(pending):
+                            pending = pending[skip:]
+                        else:
+                            f.seek(comp_offset)
+                            pending = b''
+                        continue
+                    if record:
+                        self.checkpoints.append((comp_offset, data_offset))
+                    decoder = self._decoder()
+
+                out = decoder.decompress(pending)
+                eof = getattr(decoder, 'eof', False)
+                unused = decoder.unused_data if eof else b''
+                comp_offset += len(pending) - len(unused)
+                pending = unused
+                if out:
+                    yield data_offset, out
+                    data_offset += len(out)
+                if eof:
+                    decoder = None
+                elif record and hasattr(decoder, 'copy') and data_offset - last_snapshot >= self.checkpoint_bytes:
+                    # all input so far is consumed, so the copy resumes at comp_offset
+                    self.snapshots.append((comp_offset, data_offset, decoder.copy()))
+                    last_snapshot = data_offset
+
+    def scan(self) -> Iterator[bytes]:
+        """decode the whole file, recording checkpoints on the way"""
+        self.checkpoints = []
+        self.snapshots = []
+        size = 0
+        for offset, data in self._decode(0, 0, record=True):
+            size = offset + len(data)
+            yield data
+        self.data_size = size
+        self._snapshot_pass_done = True
+        self._warn_long_frames()
+
+    def _warn_long_frames(self):
+        # zstd decoders can not be copied: frame starts are the only restart points
+        if self.codec != 'zstd':
+            return
+        starts = [c[1] for c in self.checkpoints] + [self.data_size]
+        longest = max((b - a for a, b in zip(starts, starts[1:])), default=0)
+        if longest > self.checkpoint_bytes:
+            print(f"⚠️  {self.filepath}: a zstd frame holds {longest / 2**20:.0f} MB, every chunk in it "
+                  f"is decoded from the frame start; recompress with smaller frames (e.g. pzstd)")
+
+    def _restart_point(self, start: int):
+        """closest (compressed offset, uncompressed offset, decoder) at or before `start`"""
+        comp_offset, data_offset, decoder = 0, 0, None
+        i = bisect.bisect_right([c[1] for c in self.checkpoints], start) - 1
+        if i >= 0:
+            comp_offset, data_offset = self.checkpoints[i]
+        j = bisect.bisect_right([s[1] for s in self.snapshots], start) - 1
+        if j >= 0 and self.snapshots[j][1] > data_offset:
+            comp_offset, data_offset, decoder = self.snapshots[j]
+            decoder = decoder.copy()
+        return comp_offset, data_offset, decoder
+
+    def iter_range(self, start: int, end: int) -> Iterator[bytes]:
+        """uncompressed bytes [start, end), block by block as decoded"""
+        end = min(end, self.data_size)
+        if start >= end:
+            return
+        with self._lock:
+            restart = self._restart_point(start)
+            if (start - restart[1] > self.checkpoint_bytes and self.codec == 'gzip'
+                    and not self._snapshot_pass_done):
+                # one pass rebuilds the in-memory restart points of big gzip members
+                print(f"🔍 Building restart points for {self.filepath}...")
+                for _ in self.scan():
+                    pass
+                restart = self._restart_point(start)
+
+        blocks = self._decode(*restart)
+        try:
+            for offset, data in blocks:
+                if offset + len(data) <= start:
+                    continue
+                yield data[max(0, start - offset):end - offset]
+                if offset + len(data) >= end:
+                    break
+        finally:
+            blocks.close()
+
+    def read(self, start: int, end: int) -> bytes:
+        """uncompressed bytes [start, end)"""
+        return b''.join(self.iter_range(start, end))
+
+    def get_rows(self, file_size: int) -> List[Tuple[int, int]]:
+        """checkpoints to persist, closed by a (file_size, data_size) row"""
+        return self.checkpoints + [(file_size, self.data_size)]
+
+    def set_rows(self, rows: List[Tuple[int, int]]):
+        self.checkpoints = [tuple(r) for r in rows[:-1]]
+        self.data_size = rows[-1][1]
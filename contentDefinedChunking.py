@@ -0,0 +1,82 @@
+import hashlib
+from typing import List, Sequence
+
+# gear hash (FastCDC): h = (h << 1) + GEAR[byte], so a bit k of h only depends
+# on the last k+1 bytes and the whole hash on the last 64 bytes.
+GEAR = [int.from_bytes(hashlib.md5(bytes([i])).digest()[:8], 'big') for i in range(256)]
+MASK64 = (1 << 64) - 1
+WINDOW = 64
+# mean chunk size over the normal size: from normal/4, a cut chance of
+# 1/(2*normal) per byte up to normal, then 2/normal up to 4*normal
+# 1/4 + 2(1 - e^-3/8) + e^-3/8 (1 - e^-6) / 2 = 1.22
+MEAN_OVER_NORMAL = 1.22
+
+
+def cdc_sizes(avg_size: int):
+    """(min, normal, max) chunk size in bytes, so that chunks average about `avg_size`"""
+    normal = max(64, round(max(avg_size, 1) / MEAN_OVER_NORMAL))
+    return normal // 4, normal, normal * 4
+
+
+def _thresholds(normal: int):
+    # normalized chunking: harder to cut before normal, easier after it.
+    # compared with the high bits, which depend on the whole 64 byte window;
+    # for a power of two normal these are the FastCDC masks
+    return (1 << 32) // (normal * 2), (2 << 32) // normal
+
+
+def _window_hash(data, start: int, end: int) -> int:
+    h = 0
+    for b in data[max(start, end - WINDOW):end]:
+        h = ((h << 1) + GEAR[b]) & MASK64
+    return h
+
+
+def byte_cut_points(data, start: int, avg_size: int) -> List[int]:
+    """chunk end offsets for `data[start:]`, cutting at any byte"""
+    min_size, normal, max_size = cdc_sizes(avg_size)
+    small, large = _thresholds(normal)
+    cuts = []
+    length = len(data)
+    chunk_start = start
+    while chunk_start < length:
+        end = min(chunk_start + max_size, length)
+        pos = min(chunk_start + min_size, end)
+        h = 0
+        cut = end
+        while pos < end:
+            h = ((h << 1) + GEAR[data[pos]]) & MASK64
+            pos += 1
+            if (h >> 32) < (small if pos - chunk_start < normal else large):
+                cut = pos
+                break
+        cuts.append(cut)
+        chunk_start = cut
+    return cuts
+
+
+def item_cut_points(data, item_positions: Sequence[int], start_item: int, avg_size: int) -> List[int]:
+    """chunk end item indices from `start_item` on, cutting only after whole items"""
+    min_size, normal, max_size = cdc_sizes(avg_size)
+    cuts = []
+    total_items = len(item_positions) - 1
+    chunk_start = start_item
+    item = start_item
+    while item < total_items:
+        item += 1
+        size = item_positions[item] - item_positions[chunk_start]
+        if size < min_size and item < total_items:
+            continue
+        if size >= max_size or item == total_items:
+            cut = True
+        else:
+            # an item end stands for all of the item's bytes: cut with the
+            # probability the byte mode masks would give over that many bytes
+            item_size = item_positions[item] - item_positions[item - 1]
+            h = _window_hash(data, item_positions[chunk_start], item_positions[item])
+            threshold = (item_size << 32) // (normal * 2) if size < normal else (item_size << 33) // normal
+            cut = (h >> 32) < threshold
+        if cut:
+            cuts.append(item)
+            chunk_start = item
+    return cuts
@@ -0,0 +1,114 @@
+import bisect
+import json
+from typing import Dict, List, Optional
+from storage import get_storage
+
+
+class DFlowRegistry:
+    """DFlows indexed by hash and path, persisted one row per DFlow in SQLite"""
+
+    def __init__(self, db_file: str = 'dflows.db'):
+        self.db_file = db_file
+        self.db = get_storage(db_file)
+        self.DBcreate_table()
+        self.by_hash: Dict[str, object] = {}
+        self.by_path: Dict[str, object] = {}
+        self._sorted_hashes: List[str] = []
+
+    def DBcreate_table(self):
+        def create(cur):
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS dflows (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                file_hash TEXT NOT NULL UNIQUE,
+                filepath TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            """)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS registry_info (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """)
+        self.db.transaction(create)
+
+    # ---- persistence ----
+
+    def load_rows(self) -> List[dict]:
+        return [json.loads(row[0]) for row in self.db.query("SELECT data FROM dflows ORDER BY id")]
+
+    def import_rows(self, rows: List[dict], source: str) -> bool:
+        """one-time import of a legacy manifest (e.g. dflows.json)"""
+        if self.get_info(f"imported:{source}"):
+            return False
+        def import_all(cur):
+            cur.executemany(
+                "INSERT OR IGNORE INTO dflows (file_hash, filepath, data) VALUES (?, ?, ?)",
+                [(data['file_hash'], data['filepath'], json.dumps(data, ensure_ascii=False)) for data in rows]
+            )
+            cur.execute(
+                "INSERT OR REPLACE INTO registry_info (key, value) VALUES (?, ?)",
+                (f"imported:{source}", '1')
+            )
+        self.db.transaction(import_all)
+        return True
+
+    def get_info(self, key: str) -> Optional[str]:
+        row = self.db.query_one("SELECT value FROM registry_info WHERE key = ?", (key,))
+        return row[0] if row else None
+
+    def save(self, dflows: list):
+        """write the given DFlows, each in its own atomic upsert"""
+        self.db.executemany(
+            """
+            INSERT INTO dflows (file_hash, filepath, data) VALUES (?, ?, ?)
+            ON CONFLICT(file_hash) DO UPDATE SET filepath = excluded.filepath, data = excluded.data
+            """,
+            [(dflow.file_hash, dflow.filepath, json.dumps(dflow.to_dict(), ensure_ascii=False)) for dflow in dflows]
+        )
+
+    # ---- in-memory indexes ----
+
+    def add(self, dflow, persist: bool = True):
+        self.by_hash[dflow.file_hash] = dflow
+        self.by_path[dflow.filepath] = dflow
+        bisect.insort(self._sorted_hashes, dflow.file_hash)
+        if persist:
+            self.save([dflow])
+
+    def remove(self, file_hash: str):
+        dflow = self.by_hash.pop(file_hash, None)
+        if dflow is None:
+            return None
+        if self.by_path.get(dflow.filepath) is dflow:
+            del self.by_path[dflow.filepath]
+        i = bisect.bisect_left(self._sorted_hashes, file_hash)
+        del self._sorted_hashes[i]
+        self.db.execute("DELETE FROM dflows WHERE file_hash = ?", (file_hash,))
+        return dflow
+
+    def reset(self):
+        """forget the loaded DFlows, the rows stay"""
+        self.by_hash.clear()
+        self.by_path.clear()
+        self._sorted_hashes.clear()
+
+    def clear(self):
+        self.reset()
+        self.db.execute("DELETE FROM dflows")
+
+    def find_prefix(self, prefix: str) -> list:
+        """DFlows whose hash starts with `prefix` (the CLI shows file_hash[:8])"""
+        i = bisect.bisect_left(self._sorted_hashes, prefix)
+        found = []
+        while i < len(self._sorted_hashes) and self._sorted_hashes[i].startswith(prefix):
+            found.append(self.by_hash[self._sorted_hashes[i]])
+            i += 1
+        return found
+
+    def values(self) -> list:
+        return list(self.by_hash.values())
+
+    def __len__(self):
+        return len(self.by_hash)
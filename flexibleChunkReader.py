@@ -1,10 +1,88 @@
 import os
+import bisect
+import codecs
 import hashlib
 from typing import Iterator, Optional, Tuple, Union
 # import array
 # import zlib
 import mmap
-import sqlite3
+import csv
+from functions import get_prefix_hash
+from storage import get_storage
+from contentDefinedChunking import byte_cut_points, item_cut_points, cdc_sizes
+from metrics import CHUNK_READ_SECONDS
+from compressedInput import CompressedInput, detect_codec
+from columnarCsv import ColumnarCsv
+from setting import compressed_checkpoint_bytes, stream_block_bytes
+import time
+
+
+def delimiter_bytes(mode: str, delimiter: Union[str, bytes, None]) -> bytes:
+    if mode in ['line', 'csv', 'columnar']:
+        return b'\n'
+    return delimiter.encode('utf-8') if isinstance(delimiter, str) else delimiter
+
+
+def scan_item_ends(filepath: str, delimiter_bytes: bytes, start: int = 0) -> list:
+    """offsets right after each delimiter from `start` to the end of file"""
+    ends = []
+    if not os.path.getsize(filepath):
+        return ends
+    with open(filepath, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = start
+            while pos < len(mm):
+                next_pos = mm.find(delimiter_bytes, pos)
+                if next_pos == -1:
+                    if pos < len(mm):
+                        ends.append(len(mm))
+                    break
+                ends.append(next_pos + len(delimiter_bytes))
+                pos = next_pos + len(delimiter_bytes)
+    return ends
+
+
+def scan_compressed_item_ends(compressed: CompressedInput, delimiter_bytes: bytes) -> list:
+    """item ends of a compressed file, in one decoding pass that also records its checkpoints"""
+    ends = []
+    tail = b''
+    base = 0  # uncompressed offset of tail
+    for block in compressed.scan():
+        data = tail + block
+        pos = 0
+        while True:
+            next_pos = data.find(delimiter_bytes, pos)
+            if next_pos == -1:
+                break
+            pos = next_pos + len(delimiter_bytes)
+            ends.append(base + pos)
+        # keep enough for a delimiter split across blocks
+        cut = max(pos, len(data) - len(delimiter_bytes) + 1)
+        tail = data[cut:]
+        base += cut
+    if base + len(tail) > (ends[-1] if ends else 0):
+        ends.append(base + len(tail))
+    return ends
+
+
+def parse_items(chunk_data: Optional[str], mode: str, delimiter: Union[str, bytes, None]) -> list:
+    if not chunk_data:
+        return []
+    
+    if mode == 'csv':
+        lines = chunk_data.strip().split('\n')
+        return [line.split(',') for line in lines if line.strip()]
+    
+    elif mode == 'token':
+        items = chunk_data.split(delimiter)
+        return [item.strip() for item in items if item.strip()]
+    
+    elif mode == 'line':
+        return [line for line in chunk_data.split('\n') if line.strip()]
+    
+    else:  # byte mode
+        return [chunk_data]
+
 
 class FlexibleChunkReader:
     
@@ -12,7 +90,14 @@ class FlexibleChunkReader:
                  items_per_chunk: int = 2048, 
                  delimiter: Union[str, bytes, None] = '\n',
                  mode: str = 'line',
-                 total_items = 0 #just for loading
+                 total_items = 0, #just for loading
+                 index_hash: Optional[str] = None, # index of an earlier version of this file
+                 index_size: int = 0,
+                 chunking: str = 'fixed', # 'fixed' or 'cdc' (content-defined)
+                 avg_chunk_bytes: int = 0, # cdc target size, 0 = items_per_chunk items on average
+                 columns: Optional[list] = None, # columnar: projection, default all columns
+                 schema: Optional[dict] = None, # columnar: column -> 'int'/'float'/'str', inferred if missing
+                 has_header: bool = True
                  ):
 
         self.filepath = filepath
@@ -20,24 +105,87 @@ class FlexibleChunkReader:
         self.delimiter = delimiter
         self.mode = mode
         self.file_size = os.path.getsize(filepath)
+        # gzip/zstd input: offsets below are in uncompressed bytes, data_size long
+        codec = detect_codec(filepath) if self.file_size else None
+        self.compressed = CompressedInput(filepath, codec, compressed_checkpoint_bytes) if codec else None
+        self.data_size = 0 if self.compressed else self.file_size
         self.total_items = total_items
+        self.stale_chunks = []  # chunks whose content changed by an append
+        self.chunking = chunking
+        self.avg_chunk_bytes = avg_chunk_bytes
+        self.chunk_bounds = None  # cdc: chunk i is [chunk_bounds[i], chunk_bounds[i+1]) items (bytes in byte mode)
 
         if mode == 'line':
             self.delimiter = '\n'
-        elif mode == 'csv':
+        elif mode in ['csv', 'columnar']:
             self.delimiter = '\n'
+        if self.compressed and chunking == 'cdc':
+            raise ValueError("content-defined chunking needs an uncompressed file")
         
         # creating and saving indexes
-        self.hash = self.get_file_hash()
-        self.conn = sqlite3.connect(f"{self.hash}.db")
+        self.content_hash = self.get_file_hash()
+        self.hash = self.content_hash
+        if (index_hash and index_hash != self.content_hash and not self.compressed and
+                self._matches_index(index_hash, index_size)):
+            # keep the old index (and the DFlow progress next to it)
+            self.hash = index_hash
+        self.db = get_storage(f"{self.hash}.db")
         self.DBcreate_table()
+        previous = self._load_file_info_DB()
         self._load_item_positions_DB()
-        if(hasattr(self, "item_positions")):
+        if self.compressed and not self._load_checkpoints_DB() and hasattr(self, "item_positions"):
+            self._scan_checkpoints()
+        grown = (previous and previous[0] < self.file_size and previous[1] != self.content_hash
+                 and not self.compressed)
+        if grown and (self.mode == 'byte' or hasattr(self, "item_positions")):
+            self._extend_index(previous[0])
+        elif(hasattr(self, "item_positions")):
             self.total_items = len(self.item_positions) - 1
             self.total_chunks = (self.total_items + self.items_per_chunk - 1) // self.items_per_chunk
         else:
             self._build_index()
             self._save_item_positionsDB()
+        if self.chunking == 'cdc':
+            self._setup_chunk_bounds()
+        self._save_file_info_DB()
+        self.columnar = None
+        self.has_header = has_header
+        if self.mode == 'columnar':
+            self._setup_columnar(columns, schema)
+
+    def _matches_index(self, index_hash: str, index_size: int) -> bool:
+        """True if `index_hash`.db indexes this file, or a prefix of it"""
+        if not os.path.exists(f"{index_hash}.db"):
+            return False
+        db = get_storage(f"{index_hash}.db")
+        row = None
+        if db.query_one("SELECT name FROM sqlite_master WHERE type='table' AND name='file_info';"):
+            row = db.query_one("SELECT file_size, content_hash FROM file_info WHERE id = 0")
+        # databases from before file_info existed are named after their content
+        size, content_hash = row if row else (index_size, index_hash)
+        if content_hash == self.content_hash:
+            return True
+        if not size or size >= self.file_size:
+            return False
+        return get_prefix_hash(self.filepath, size) == content_hash
+
+    def _delimiter_bytes(self) -> bytes:
+        return delimiter_bytes(self.mode, self.delimiter)
+
+    def _scan_item_ends(self, start: int) -> list:
+        """offsets right after each delimiter from `start` to the end of file"""
+        if self.compressed:
+            ends = scan_compressed_item_ends(self.compressed, self._delimiter_bytes())
+            self.data_size = self.compressed.data_size
+            self._save_checkpoints_DB()
+            return ends
+        return scan_item_ends(self.filepath, self._delimiter_bytes(), start)
+
+    def _scan_checkpoints(self):
+        for _ in self.compressed.scan():
+            pass
+        self.data_size = self.compressed.data_size
+        self._save_checkpoints_DB()
 
     # def handle_index
 
@@ -45,96 +193,204 @@ class FlexibleChunkReader:
         print(f"🔍 Creating index ({self.mode} mode)...")
         
         if self.mode == 'byte':
-            self.total_chunks = (self.file_size + self.items_per_chunk - 1) // self.items_per_chunk
+            if self.compressed and not self.compressed.checkpoints:
+                self._scan_checkpoints()
+            self.total_chunks = (self.data_size + self.items_per_chunk - 1) // self.items_per_chunk
             self.item_positions = None
             print(f"✅ Byte mod: {self.total_chunks} chunk")
             return
         
-        self.item_positions = [0]
-        if self.mode in ['line', 'csv']:
-            with open(self.filepath, 'rb') as f:
-                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
-                    pos = 0
-                    while pos < len(mm):
-                        next_pos = mm.find(b'\n', pos)
-                        if next_pos == -1:
-                            if pos < len(mm):
-                                self.item_positions.append(len(mm))
-                            break
-                        self.item_positions.append(next_pos + 1)
-                        pos = next_pos + 1
-        
-        elif self.mode == 'token':
-            delimiter_bytes = self.delimiter.encode('utf-8') if isinstance(self.delimiter, str) else self.delimiter
-            
-            with open(self.filepath, 'rb') as f:
-                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
-                    pos = 0
-                    while pos < len(mm):
-                        next_pos = mm.find(delimiter_bytes, pos)
-                        if next_pos == -1:
-                            if pos < len(mm):
-                                self.item_positions.append(len(mm))
-                            break
-                        self.item_positions.append(next_pos + len(delimiter_bytes))
-                        pos = next_pos + len(delimiter_bytes)
+        self.item_positions = [0] + self._scan_item_ends(0)
         
         self.total_items = len(self.item_positions) - 1
         self.total_chunks = (self.total_items + self.items_per_chunk - 1) // self.items_per_chunk
         
         print(f"✅ index created:{self.total_items:,} items، {self.total_chunks} chunk")
     
+    def _extend_index(self, old_size: int):
+        """index only the bytes appended after `old_size`"""
+        print(f"🔍 File grew, indexing new tail ({self.file_size - old_size:,} bytes)...")
+
+        if self.mode == 'byte':
+            old_total_chunks = (old_size + self.items_per_chunk - 1) // self.items_per_chunk
+            if old_size % self.items_per_chunk:
+                self.stale_chunks = [old_total_chunks - 1]
+            self._build_index()
+            return
+
+        old_total_items = len(self.item_positions) - 1
+        old_total_chunks = (old_total_items + self.items_per_chunk - 1) // self.items_per_chunk
+        keep = len(self.item_positions)
+        if keep > 1 and not self._ends_with_delimiter(old_size):
+            # the last item had no delimiter yet, so it may have been continued
+            keep -= 1
+        new_ends = self._scan_item_ends(self.item_positions[keep - 1])
+        self.item_positions = self.item_positions[:keep] + new_ends
+
+        # the old last chunk changed if it was partial or its last item was continued
+        if old_total_chunks and (old_total_items % self.items_per_chunk or keep < old_total_items + 1):
+            self.stale_chunks = [old_total_chunks - 1]
+
+        self.db.execute("DELETE FROM indexes WHERE id >= ?", (keep,))
+        self._save_item_positionsDB(keep)
+
+        self.total_items = len(self.item_positions) - 1
+        self.total_chunks = (self.total_items + self.items_per_chunk - 1) // self.items_per_chunk
+        print(f"✅ index extended: {self.total_items:,} items، {self.total_chunks} chunk (+{self.total_chunks - old_total_chunks})")
+
+    def _setup_chunk_bounds(self):
+        """load or (re)build the content-defined chunk boundaries"""
+        if not self.avg_chunk_bytes:
+            per_item = self.data_size / self.total_items if self.mode != 'byte' and self.total_items else 1
+            self.avg_chunk_bytes = max(1, int(self.items_per_chunk * per_item))
+        spec = f"cdc:{cdc_sizes(self.avg_chunk_bytes)[1]}"
+        units = self.data_size if self.mode == 'byte' else self.total_items
+
+        bounds = self._load_chunk_bounds_DB(spec)
+        if not bounds:
+            # bounds cut when the size was rounded up to a power of two stay valid,
+            # so the chunks (and results) of older DFlows keep their indexes
+            legacy = f"cdc:{1 << max(6, (self.avg_chunk_bytes - 1).bit_length())}"
+            bounds = self._load_chunk_bounds_DB(legacy) if legacy != spec else []
+            if bounds:
+                self.chunk_bounds = bounds
+                self._save_chunk_bounds_DB(spec)
+        if bounds and bounds[-1] == units:
+            self.chunk_bounds = bounds
+            self.total_chunks = len(bounds) - 1
+            return
+
+        # after an append only the last chunk and the new tail are cut again
+        old_total_chunks = len(bounds) - 1 if bounds else 0
+        keep = bounds[:-1] if old_total_chunks else [0]
+        print(f"🔍 Content-defined chunking from chunk {len(keep) - 1}...")
+        if self.file_size:
+            with open(self.filepath, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if self.mode == 'byte':
+                        cuts = byte_cut_points(mm, keep[-1], self.avg_chunk_bytes)
+                    else:
+                        cuts = item_cut_points(mm, self.item_positions, keep[-1], self.avg_chunk_bytes)
+        else:
+            cuts = []
+        self.chunk_bounds = keep + cuts
+        self.total_chunks = len(self.chunk_bounds) - 1
+        self.stale_chunks = [old_total_chunks - 1] if old_total_chunks else []
+        self._save_chunk_bounds_DB(spec, len(keep) - 1)
+        print(f"✅ {self.total_chunks} content-defined chunk")
+
+    def _setup_columnar(self, columns: Optional[list], schema: Optional[dict]):
+        """header from the first line, missing column types from the first rows"""
+        first = self._read_item_span(0, 1) if self.total_items else ''
+        row = next(csv.reader([first.rstrip('\r\n')]), [])
+        header = row if self.has_header else [f"c{i}" for i in range(len(row))]
+        self.columnar = ColumnarCsv(header, schema, columns)
+        if not self.columnar.inferred:
+            self.columnar.infer(self._read_item_span(0, min(self.total_items, 1001)), skip_header=self.has_header)
+
+    def _chunk_range(self, chunk_index: int) -> Tuple[int, int]:
+        """[start, end) of a chunk in items (bytes in byte mode)"""
+        if self.chunk_bounds is not None:
+            return self.chunk_bounds[chunk_index], self.chunk_bounds[chunk_index + 1]
+        start = chunk_index * self.items_per_chunk
+        units = self.data_size if self.mode == 'byte' else self.total_items
+        return start, min(start + self.items_per_chunk, units)
+
+    def _ends_with_delimiter(self, size: int) -> bool:
+        delimiter_bytes = self._delimiter_bytes()
+        if size < len(delimiter_bytes):
+            return False
+        with open(self.filepath, 'rb') as f:
+            f.seek(size - len(delimiter_bytes))
+            return f.read(len(delimiter_bytes)) == delimiter_bytes
+    
     def DBcreate_table(self):
-        cur = self.conn.cursor()
-        try:
-            cur.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name=?;", 
-                ('indexes',)
-            )
-            if cur.fetchone() is None: 
-                cur.execute("""
-                CREATE TABLE indexes (
-                    id INTEGER PRIMARY KEY,
-                    offset INTEGER NOT NULL
-                );
-                """)
-                self.conn.commit()
-        finally:
-            cur.close()
+        def create(cur):
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS indexes (
+                id INTEGER PRIMARY KEY,
+                offset INTEGER NOT NULL
+            );
+            """)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS file_info (
+                id INTEGER PRIMARY KEY,
+                file_size INTEGER NOT NULL,
+                content_hash TEXT NOT NULL
+            );
+            """)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS chunk_bounds (
+                spec TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                bound INTEGER NOT NULL,
+                PRIMARY KEY (spec, id)
+            );
+            """)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                id INTEGER PRIMARY KEY,
+                comp_offset INTEGER NOT NULL,
+                data_offset INTEGER NOT NULL
+            );
+            """)
+        self.db.transaction(create)
+
+    def _load_chunk_bounds_DB(self, spec: str) -> list:
+        rows = self.db.query("SELECT bound FROM chunk_bounds WHERE spec = ? ORDER BY id", (spec,))
+        return [row[0] for row in rows]
+
+    def _save_chunk_bounds_DB(self, spec: str, start: int = 0):
+        self.db.execute("DELETE FROM chunk_bounds WHERE spec = ? AND id >= ?", (spec, start))
+        self.db.executemany(
+            "INSERT INTO chunk_bounds (spec, id, bound) VALUES (?, ?, ?)",
+            ((spec, idx, self.chunk_bounds[idx]) for idx in range(start, len(self.chunk_bounds)))
+        )
+
+    def _load_checkpoints_DB(self) -> bool:
+        """restart points of a compressed file, False if it was never indexed"""
+        rows = self.db.query("SELECT comp_offset, data_offset FROM checkpoints ORDER BY id")
+        if not rows:
+            return False
+        self.compressed.set_rows(rows)
+        self.data_size = self.compressed.data_size
+        return True
+
+    def _save_checkpoints_DB(self):
+        self.db.execute("DELETE FROM checkpoints")
+        self.db.executemany(
+            "INSERT INTO checkpoints (id, comp_offset, data_offset) VALUES (?, ?, ?)",
+            ((idx, comp, data) for idx, (comp, data) in enumerate(self.compressed.get_rows(self.file_size)))
+        )
+
+    def _load_file_info_DB(self) -> Optional[Tuple[int, str]]:
+        """(file_size, content_hash) of the file when it was last indexed"""
+        row = self.db.query_one("SELECT file_size, content_hash FROM file_info WHERE id = 0")
+        return (row[0], row[1]) if row else None
+
+    def _save_file_info_DB(self):
+        self.db.execute(
+            "INSERT OR REPLACE INTO file_info (id, file_size, content_hash) VALUES (0, ?, ?)",
+            (self.file_size, self.content_hash)
+        )
 
     def _load_item_positions_DB(self):
-        cur = self.conn.cursor()
-        try:
-            cur.execute(
-                "select * from indexes order by id"
-                )
-            rows = cur.fetchall()
-            if(len(rows)):
-                self.item_positions = [0]
-                for row in rows:
-                    self.item_positions.append(row[1])
-        finally:
-            cur.close()  
-
-    def _save_item_positionsDB(self):
+        rows = self.db.query("select * from indexes order by id")
+        if(len(rows)):
+            # row 0 is the leading 0 offset saved by _save_item_positionsDB
+            self.item_positions = [row[1] for row in rows]
+
+    def _save_item_positionsDB(self, start: int = 0):
         if not self.item_positions:
             return
-        cur = self.conn.cursor()
-        try:
-            for idx, p in enumerate(self.item_positions):
-                cur.execute(
-                    """
-                    INSERT INTO indexes (id, offset)
-                    VALUES (?, ?)
-                    """,
-                    (idx, p)
-                )
-
-            # Commit once after all inserts
-            self.conn.commit()
-
-        finally:
-            cur.close()
+        # one batched write for all offsets
+        self.db.executemany(
+            """
+            INSERT INTO indexes (id, offset)
+            VALUES (?, ?)
+            """,
+            ((idx, self.item_positions[idx]) for idx in range(start, len(self.item_positions)))
+        )
                     
     def read_chunk(self, chunk_index: int) -> Optional[str]:
         """reading one chunk"""
@@ -148,53 +404,142 @@ class FlexibleChunkReader:
     
     def _read_chunk_bytes(self, chunk_index: int) -> str:
         """reading chunk base on byte"""
-        start_pos = chunk_index * self.items_per_chunk
-        end_pos = min(start_pos + self.items_per_chunk, self.file_size)
-        
+        start_pos, end_pos = self._chunk_range(chunk_index)
+        return self._read_bytes(start_pos, end_pos)
+    
+    def _read_bytes(self, start_pos: int, end_pos: int) -> str:
+        if self.compressed:
+            return self.compressed.read(start_pos, end_pos).decode('utf-8', errors='ignore')
         with open(self.filepath, 'rb') as f:
             f.seek(start_pos)
             data = f.read(end_pos - start_pos)
         
         return data.decode('utf-8', errors='ignore')
+
+    def _iter_raw(self, start_pos: int, end_pos: int, block_bytes: int = stream_block_bytes) -> Iterator[bytes]:
+        """raw (uncompressed) bytes of [start_pos, end_pos), a block at a time"""
+        if self.compressed:
+            yield from self.compressed.iter_range(start_pos, end_pos)
+            return
+        with open(self.filepath, 'rb') as f:
+            f.seek(start_pos)
+            while start_pos < end_pos:
+                data = f.read(min(block_bytes, end_pos - start_pos))
+                if not data:
+                    return
+                start_pos += len(data)
+                yield data
     
     def _read_chunk_items(self, chunk_index: int) -> str:
         """reading chunk base on item"""
-        start_item = chunk_index * self.items_per_chunk
-        end_item = min(start_item + self.items_per_chunk, self.total_items)
-        
+        start_item, end_item = self._chunk_range(chunk_index)
+        return self._read_item_span(start_item, end_item)
+    
+    def _read_item_span(self, start_item: int, end_item: int) -> str:
         if start_item >= len(self.item_positions) - 1:
             return ""
         
         start_pos = self.item_positions[start_item]
         end_pos = self.item_positions[min(end_item, len(self.item_positions) - 1)]
-        
-        with open(self.filepath, 'rb') as f:
-            f.seek(start_pos)
-            data = f.read(end_pos - start_pos)
-        
-        return data.decode('utf-8', errors='ignore')
+        return self._read_bytes(start_pos, end_pos)
+    
+    @property
+    def file_mtime(self) -> float:
+        return os.path.getmtime(self.filepath)
+
+    @property
+    def total_units(self) -> int:
+        """what chunk ranges count: items, or bytes in byte mode"""
+        return self.data_size if self.mode == 'byte' else self.total_items
+    
+    def read_items_range(self, start: int, end: int) -> list:
+        """items of [start, end) in items (bytes in byte mode), regardless of chunk bounds"""
+        start_time = time.perf_counter()
+        end = min(end, self.total_units)
+        if start >= end:
+            return []
+        if self.mode == 'byte':
+            chunk_data = self._read_bytes(start, end)
+        else:
+            chunk_data = self._read_item_span(start, end)
+        items = self._parse_items(chunk_data, start)
+        CHUNK_READ_SECONDS.observe(time.perf_counter() - start_time, mode=self.mode)
+        return items
     
+    def chunk_range(self, chunk_index: int) -> Tuple[int, int]:
+        """[start, end) of a chunk, in the units of read_items_range"""
+        return self._chunk_range(chunk_index)
+
+    def iter_items_range(self, start: int, end: int, block_bytes: int = stream_block_bytes) -> Iterator:
+        """
+        the items of read_items_range, read `block_bytes` at a time; in
+        byte mode the items are the decoded text blocks
+        """
+        end = min(end, self.total_units)
+        if start >= end:
+            return
+        if self.mode == 'byte':
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+            for data in self._iter_raw(start, end, block_bytes):
+                text = decoder.decode(data)
+                if text:
+                    yield text
+            return
+
+        positions = self.item_positions
+        offset, item, pending = positions[start], start, b''
+        for data in self._iter_raw(positions[start], positions[end], block_bytes):
+            pending += data
+            # parse the whole items read so far, keep the partial last one
+            upto = bisect.bisect_right(positions, offset + len(pending), item, end + 1) - 1
+            if upto > item:
+                cut = positions[upto] - offset
+                yield from self._parse_items(pending[:cut].decode('utf-8', errors='ignore'), item)
+                pending, offset, item = pending[cut:], offset + cut, upto
+
+    def range_hash(self, start: int, end: int) -> str:
+        """
+        hash of the raw bytes of [start, end), read block by block. The
+        bytes alone do not fix the items a script sees, so the mode,
+        delimiter and, in byte mode, the block framing are hashed first.
+        """
+        end = min(end, self.total_units)
+        if self.mode != 'byte':
+            start, end = self.item_positions[min(start, end)], self.item_positions[end]
+            framing = ''
+        else:
+            # byte mode items are blocks: read ones, or decoded ones of compressed input
+            framing = self.compressed.codec if self.compressed else stream_block_bytes
+        hasher = hashlib.md5(f"{self.mode}\0{self.delimiter!r}\0{framing}\0".encode('utf-8'))
+        for data in self._iter_raw(start, end):
+            hasher.update(data)
+        return hasher.hexdigest()
+
+    def split_range(self, start: int, end: int) -> int:
+        """middle of [start, end), not inside a UTF-8 character in byte mode"""
+        middle = (start + end) // 2
+        if self.mode == 'byte':
+            head = b''.join(self._iter_raw(middle, min(middle + 4, end)))
+            while head and head[0] & 0xC0 == 0x80:  # continuation byte
+                head = head[1:]
+                middle += 1
+        return middle
+
     def read_items(self, chunk_index: int) -> list:
         """
         return each chuck items in list foramt 
         """
-        chunk_data = self.read_chunk(chunk_index)
-        if not chunk_data:
-            return []
-        
-        if self.mode == 'csv':
-            lines = chunk_data.strip().split('\n')
-            return [line.split(',') for line in lines if line.strip()]
-        
-        elif self.mode == 'token':
-            items = chunk_data.split(self.delimiter)
-            return [item.strip() for item in items if item.strip()]
-        
-        elif self.mode == 'line':
-            return [line for line in chunk_data.split('\n') if line.strip()]
-        
-        else:  # byte mode
-            return [chunk_data]
+        start = time.perf_counter()
+        start_item = self._chunk_range(chunk_index)[0] if 0 <= chunk_index < self.total_chunks else None
+        items = self._parse_items(self.read_chunk(chunk_index), start_item)
+        CHUNK_READ_SECONDS.observe(time.perf_counter() - start, mode=self.mode)
+        return items
+
+    def _parse_items(self, chunk_data: Optional[str], start_item: Optional[int] = None):
+        if self.columnar:
+            # dict of column arrays; the header line is item 0
+            return self.columnar.parse(chunk_data, skip_header=self.has_header and start_item == 0)
+        return parse_items(chunk_data, self.mode, self.delimiter)
     
     def iter_chunks(self, start_chunk: int = 0, end_chunk: Optional[int] = None) -> Iterator[Tuple[int, str]]:
         """Iterator for reading mutiple chunk"""
@@ -221,16 +566,16 @@ class FlexibleChunkReader:
         chunk_size = len(chunk_data.encode('utf-8')) if chunk_data else 0
         
         if self.mode == 'byte':
+            start_byte, end_byte = self._chunk_range(chunk_index)
             return {
                 'chunk_index': chunk_index,
-                'start_byte': chunk_index * self.items_per_chunk,
-                'end_byte': min((chunk_index + 1) * self.items_per_chunk, self.file_size),
+                'start_byte': start_byte,
+                'end_byte': end_byte,
                 'size_bytes': chunk_size,
                 'file_hash': self.get_chunk_hash(chunk_index)
             }
         else:
-            start_item = chunk_index * self.items_per_chunk
-            end_item = min(start_item + self.items_per_chunk, self.total_items)
+            start_item, end_item = self._chunk_range(chunk_index)
             
             return {
                 'chunk_index': chunk_index,
@@ -249,13 +594,22 @@ class FlexibleChunkReader:
             'mode': self.mode,
             'delimiter': repr(self.delimiter),
             'items_per_chunk': self.items_per_chunk,
+            'chunking': self.chunking,
             'total_chunks': self.total_chunks,
             'file_hash': self.hash,
         }
         
         if self.mode != 'byte':
             info['total_items'] = self.total_items
-            info['avg_chunk_size'] = self.file_size // self.total_chunks if self.total_chunks > 0 else 0
+            info['avg_chunk_size'] = self.data_size // self.total_chunks if self.total_chunks > 0 else 0
+        if self.chunking == 'cdc':
+            info['avg_chunk_bytes'] = self.avg_chunk_bytes
+        if self.columnar:
+            info.update(self.columnar.get_info())
+        if self.compressed:
+            info['compression'] = self.compressed.codec
+            info['data_size'] = self.data_size
+            info['checkpoints'] = len(self.compressed.checkpoints)
         
         return info
     
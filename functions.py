@@ -16,9 +16,38 @@ def get_file_hash(filepath, algorithm: str = 'md5') -> str:
     return hasher.hexdigest()
 
 
+def get_prefix_hash(filepath, size: int, algorithm: str = 'md5') -> str:
+    """hash of the first `size` bytes of the file"""
+    if algorithm == 'md5':
+        hasher = hashlib.md5()
+    elif algorithm == 'sha256':
+        hasher = hashlib.sha256()
+    else:
+        raise ValueError(f"unknouwn: {algorithm}")
+
+    remaining = size
+    with open(filepath, 'rb', buffering=0) as f:
+        while remaining > 0:
+            chunk = f.read(min(remaining, 128*1024*1024))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            remaining -= len(chunk)
+    return hasher.hexdigest()
+
+
 def is_file_in_my_disk(path, hash):
     if os.path.exists(path):
         file_hash = get_file_hash(path)
-        if(file_hash, hash):
+        if(file_hash == hash):
             return True
-    return False
\ No newline at end of file
+    return False
+
+
+def is_file_appended(path, hash, size):
+    """True if the file only grew since it was `size` bytes long with content `hash`"""
+    if not size or not os.path.exists(path):
+        return False
+    if os.path.getsize(path) <= size:
+        return False
+    return get_prefix_hash(path, size) == hash
@@ -1,7 +1,12 @@
 from p2p_node import P2PNode
-from DFlow import DFlow ,DFlowManager, add_file_as_dflow
+from DFlow import DFlow ,DFlowManager, add_file_as_dflow, add_multi_file_dflow
+from multiFileReader import is_multi_file_source
 from time import sleep
-from setting import chunk_size
+from setting import chunk_size, metrics_http_port
+from metrics import METRICS
+from chunkProfiler import ChunkProfiler
+from memoryGovernor import GOVERNOR
+import json
 
 
 
@@ -10,6 +15,9 @@ if __name__ == "__main__":
     node = P2PNode()
     manager = DFlowManager('dflows_real.json')
     node.start()
+    if metrics_http_port:
+        METRICS.start_http_server(metrics_http_port)
+        print(f"📈 metrics on http://localhost:{metrics_http_port}/metrics")
 
     nodeID = node.nodeID
 
@@ -19,16 +27,28 @@ if __name__ == "__main__":
         instruction = command.split()
         if(command in ["h", 'help']):
             print(
-                "/create-Dflow <file>: creating new job" + "\n" 
+                "/create-Dflow <file|dir|glob> [adaptive] [columnar] [governed]: creating new job" + "\n" 
                 "/attach-Dflow <Dflow-hash>: attching to a job"+ "\n"
                 "/list-Dflow "+ "\n"
+                "/start-all [priority]: run every local DFlow in the background"+ "\n"
+                "/jobs: DFlows running on this node"+ "\n"
+                "/metrics [peer]: node metrics, or a peer's"+ "\n"
         )
             
         if(instruction[0] == "/create-Dflow"):
 
             if len(instruction) > 1 and instruction[1]!="" :
                 path = instruction[1]
-                dflow = add_file_as_dflow(manager, path, items_per_chunk=chunk_size, mode='line')
+                adaptive = 'adaptive' in instruction[2:]
+                governed = 'governed' in instruction[2:]
+                mode = 'columnar' if 'columnar' in instruction[2:] else 'line'
+                if is_multi_file_source(path):
+                    if governed:
+                        print("⚠️  governed mode needs a single-file DFlow, ignored")
+                    dflow = add_multi_file_dflow(manager, path, items_per_chunk=chunk_size, mode=mode)
+                else:
+                    dflow = add_file_as_dflow(manager, path, items_per_chunk=chunk_size, mode=mode,
+                                              adaptive=adaptive, governed=governed)
             else:
                 print("<file> parameter required")            
                 
@@ -39,27 +59,60 @@ if __name__ == "__main__":
                 if(not dflow): 
                     print("❌ DFlow not founded!")
                 else:
+                    dflow.attach()
                     while(True):
                         sec_comn = input (f"{dflow.file_hash}: ... (h for help)")
                         if(sec_comn in ['help', 'h']):
                             print(                
-                            "/start : start flow" + "\n" 
+                            "/start [priority] [max-workers] : start flow in the background" + "\n" 
+                            "/stop : stop after the running chunks"+ "\n"
+                            "/priority <priority> [max-workers] : change share of the worker pool"+ "\n"
                             "/status : get status of chunks"+ "\n"
+                            "/profile [n] : profile chunks, cProfile every n-th"+ "\n"
+                            "/profile-report : profile of this node and its peers"+ "\n"
+                            "/profile-off : stop profiling"+ "\n"
                             "/exit : back"+ "\n"
                             )
-                        elif(sec_comn in ['/start']):
-                            dflow.fill_chunks_queue()
-                            
-
-
-
-
-
+                        elif(sec_comn.startswith('/start')):
+                            parts = sec_comn.split()
+                            priority = float(parts[1]) if len(parts) > 1 else 1.0
+                            max_workers = int(parts[2]) if len(parts) > 2 else None
+                            manager.start(dflow, priority, max_workers)
+                        elif(sec_comn in ['/stop']):
+                            manager.stop(dflow)
+                        elif(sec_comn.startswith('/priority')):
+                            parts = sec_comn.split()
+                            if len(parts) > 1:
+                                max_workers = int(parts[2]) if len(parts) > 2 else None
+                                manager.set_priority(dflow, float(parts[1]), max_workers)
+                            else:
+                                print("<priority> parameter required")
                         elif(sec_comn in ['/status']):
                             print()
                             if(dflow.fileHandle): print('Local')
                             print(dflow.chunk_size)
                             print(dflow.total_chunks)
+                            print(f"cache hits: {dflow.stats['cache_hits']}, misses: {dflow.stats['cache_misses']}")
+                            if dflow.adaptive:
+                                print(dflow.sizer.get_info())
+                            if dflow.governed:
+                                print(f"split chunks: {dflow.stats['split']}, memory: {GOVERNOR.get_info()}")
+                        elif(sec_comn.startswith('/profile-report')):
+                            combined = ChunkProfiler()
+                            if dflow.profiler:
+                                combined.merge(dflow.profiler.export())
+                            for peer in node.peers.copy():
+                                profile = node.get_peer_profile(peer, dflow.file_hash)
+                                if profile:
+                                    combined.merge(profile)
+                            print(combined.report())
+                        elif(sec_comn.startswith('/profile-off')):
+                            dflow.disable_profiling()
+                        elif(sec_comn.startswith('/profile')):
+                            parts = sec_comn.split()
+                            every_n = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 10
+                            dflow.enable_profiling(every_n)
+                            print(f"🔬 profiling on, cProfile every {every_n} chunks")
                         elif(sec_comn in ['/exit']):
                             break
                         
@@ -70,8 +123,25 @@ if __name__ == "__main__":
         if(instruction[0] == "/list-Dflow"):
             print(1)
             for i in manager.list_all():
-                print(i , ":", i.file_hash, i.fileHandle)       
+                print(i , ":", i.file_hash, 'local' if i.is_local else 'remote')       
                 
+        if(instruction[0] == "/start-all"):
+            priority = float(instruction[1]) if len(instruction) > 1 else 1.0
+            print(f"▶️  {manager.start_all(priority)} DFlow started")
+
+        if(instruction[0] == "/jobs"):
+            for job in manager.jobs():
+                print(f"{job['file_hash'][:8]}: {job['state']}, priority {job['priority']:g}, "
+                      f"running {job['running']}/{job['max_concurrency']}, waiting {job['waiting']}, done {job['served']}")
+
+        if(instruction[0] == "/metrics"):
+            if len(instruction) > 1:
+                peer_metrics = node.get_peer_metrics(instruction[1])
+                print(json.dumps(peer_metrics, indent=2) if peer_metrics else "❌ No metrics from peer")
+            else:
+                print(METRICS.render_prometheus())
+                print(f"chunks/s: {METRICS.snapshot().get('chunks_per_second', 0):.2f}")
+
         if(instruction[0] == "/exit"):
             break
 
@@ -0,0 +1,212 @@
+import io
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional
+from columnarCsv import json_default
+from metrics import CHUNK_SPILLED_BYTES
+from setting import worker_memory_limit
+
+try:
+    import psutil
+except ImportError:  # /proc/self/statm on Linux, no RSS limit elsewhere
+    psutil = None
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_process = psutil.Process() if psutil else None
+
+
+def rss_bytes() -> int:
+    """resident memory of this process, 0 if unknown"""
+    if _process is not None:
+        return _process.memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class MemoryLimitExceeded(MemoryError):
+    """a governed chunk went over the worker memory limit"""
+
+
+class WorkerBudget:
+    """memory accounting of one governed chunk (part) on one worker"""
+
+    def __init__(self, governor: 'MemoryGovernor'):
+        self.governor = governor
+        self.start_rss = rss_bytes()
+        self.read_bytes = 0
+
+    def check(self):
+        self.governor.check(self)
+
+    def track(self, items: Iterable, bytes_per_item: float = 0,
+              check_items: int = 1024, check_bytes: int = 1024 * 1024) -> Iterator:
+        """the items, counted as read; the RSS is checked every `check_items` items or `check_bytes` of input"""
+        count, unchecked = 0, 0
+        for item in items:
+            size = len(item) if isinstance(item, str) else bytes_per_item
+            self.read_bytes += size
+            unchecked += size
+            count += 1
+            if count % check_items == 0 or unchecked >= check_bytes:
+                unchecked = 0
+                self.check()
+            yield item
+
+
+class MemoryGovernor:
+    """
+    Memory limits of the node's workers. Each running governed chunk may
+    grow the process RSS by `limit` bytes. When the RSS grew more than all
+    running chunks together may, the chunk that has read the most input is
+    stopped with MemoryLimitExceeded, and its worker splits it.
+    """
+
+    def __init__(self, limit: int = worker_memory_limit):
+        self.limit = limit
+        self._budgets: List[WorkerBudget] = []
+        self._lock = threading.Lock()
+        self._rebase = False
+
+    @contextmanager
+    def budget(self):
+        budget = WorkerBudget(self)
+        with self._lock:
+            self._budgets.append(budget)
+        try:
+            yield budget
+        finally:
+            with self._lock:
+                self._budgets.remove(budget)
+
+    def check(self, budget: WorkerBudget):
+        if not self.limit:
+            return
+        rss = rss_bytes()
+        if not rss:
+            return
+        with self._lock:
+            if self._rebase:
+                # freed memory often stays in the RSS, count from here after a stop
+                self._rebase = False
+                for b in self._budgets:
+                    b.start_rss = rss
+                return
+            grown = rss - min(b.start_rss for b in self._budgets)
+            if grown <= self.limit * len(self._budgets):
+                return
+            if max(self._budgets, key=lambda b: b.read_bytes) is not budget:
+                return
+            self._rebase = True
+        raise MemoryLimitExceeded(f"RSS grew {grown / 2**20:.0f} MB, limit {self.limit / 2**20:.0f} MB per worker")
+
+    def get_info(self) -> dict:
+        return {'limit': self.limit, 'running': len(self._budgets), 'rss': rss_bytes()}
+
+
+class SpillingSink:
+    """
+    `output` of a governed chunk. append/extend like a list, but items are
+    kept JSON-encoded, and past `threshold` bytes they go to a temp file.
+    """
+
+    def __init__(self, threshold: int, budget: Optional[WorkerBudget] = None, check_every: int = 1024):
+        self.threshold = threshold
+        self.budget = budget
+        self.check_every = check_every
+        self.count = 0
+        self.spilled = 0
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self._file = None
+
+    def append(self, item):
+        data = json.dumps(item, default=json_default)
+        self._buffer.append(data)
+        self._buffered += len(data) + 1
+        self.count += 1
+        if self._buffered > self.threshold:
+            self._spill()
+        if self.budget and self.count % self.check_every == 0:
+            self.budget.check()
+
+    def extend(self, items: Iterable):
+        for item in items:
+            self.append(item)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def size(self) -> int:
+        """bytes write_to() writes"""
+        return self.spilled + self._buffered
+
+    def _spill(self):
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix='dflow-spill-')
+        data = self._joined()
+        self._file.write(data)
+        self.spilled += len(data)
+        CHUNK_SPILLED_BYTES.inc(len(data))
+        self._buffer = []
+        self._buffered = 0
+
+    def _joined(self) -> bytes:
+        # every item is followed by a comma, so sinks concatenate
+        return ''.join(data + ',' for data in self._buffer).encode('utf-8')
+
+    def write_to(self, out, block_bytes: int = 1024 * 1024):
+        if self._file is not None:
+            self._file.seek(0)
+            while True:
+                data = self._file.read(block_bytes)
+                if not data:
+                    break
+                out.write(data)
+        out.write(self._joined())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._buffer = []
+
+
+class SpilledOutput:
+    """
+    the result of a governed chunk: one JSON list of the items of all
+    sinks, in order. It stays in the sinks until written, so it can be
+    streamed into a blob without ever being one bytes object.
+    """
+
+    def __init__(self, sinks: List[SpillingSink]):
+        self.sinks = sinks
+
+    @property
+    def size(self) -> int:
+        items = sum(sink.size for sink in self.sinks)
+        # '[' + items, the last item's comma turns into ']'
+        return 1 + items if items else 2
+
+    def write_to(self, out):
+        """write the list to a file-like `out` (a BytesIO, an SQLite blob), may be repeated"""
+        out.write(b'[')
+        for sink in self.sinks:
+            sink.write_to(out)
+        if self.size > 2:
+            out.seek(-1, io.SEEK_CUR)  # over the last item's comma
+        out.write(b']')
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+# shared by all DFlows of the node, since they share its memory
+GOVERNOR = MemoryGovernor()
@@ -0,0 +1,219 @@
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+# seconds, from sub-millisecond reads up to minute long chunks
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels: dict) -> Tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _label_text(key: Tuple, extra: str = '') -> str:
+    parts = [f'{k}="{v}"' for k, v in key]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str = ''):
+        self.name = name
+        self.help = help
+        self.values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(_label_key(labels), 0)
+
+    def total(self) -> float:
+        return sum(self.values.values())
+
+    def render(self) -> list:
+        return [f'{self.name}{_label_text(k)} {v}' for k, v in list(self.values.items())]
+
+    def snapshot(self) -> dict:
+        return {_label_text(k) or 'value': v for k, v in list(self.values.items())}
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self.values[_label_key(labels)] = value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str = '', buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # labels -> [bucket counts..., +Inf count, sum]
+        self.values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0] * (len(self.buckets) + 2)
+            row[i] += 1
+            row[-1] += value
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def render(self) -> list:
+        lines = []
+        for key, row in list(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f'{self.name}_bucket{_label_text(key, le)} {cumulative}')
+            cumulative += row[-2]
+            le = 'le="+Inf"'
+            lines.append(f'{self.name}_bucket{_label_text(key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_label_text(key)} {row[-1]}')
+            lines.append(f'{self.name}_count{_label_text(key)} {cumulative}')
+        return lines
+
+    def snapshot(self) -> dict:
+        out = {}
+        for key, row in list(self.values.items()):
+            count = sum(row[:-1])
+            out[_label_text(key) or 'value'] = {
+                'count': count,
+                'sum': row[-1],
+                'avg': row[-1] / count if count else 0.0,
+                'p50': self._quantile(row, count, 0.5),
+                'p95': self._quantile(row, count, 0.95),
+            }
+        return out
+
+    def _quantile(self, row: list, count: int, q: float) -> Optional[float]:
+        """upper bound of the bucket holding the q-quantile"""
+        if not count:
+            return None
+        target = q * count
+        cumulative = 0
+        for bound, n in zip(self.buckets, row):
+            cumulative += n
+            if cumulative >= target:
+                return bound
+        return float('inf')
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        self.histogram.observe(self.elapsed, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self.metrics = {}
+        self.started_at = time.time()
+
+    def _get(self, cls, name: str, help: str, **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = cls(name, help, **kwargs)
+        return metric
+
+    def counter(self, name: str, help: str = '') -> Counter:
+        return self._get(Counter, name, help)
+
+    def gauge(self, name: str, help: str = '') -> Gauge:
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name: str, help: str = '', buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            if metric.help:
+                lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> dict:
+        """JSON friendly view, used by /metrics and the METRICS message"""
+        uptime = time.time() - self.started_at
+        out = {'uptime_seconds': uptime}
+        for name, metric in list(self.metrics.items()):
+            out[name] = metric.snapshot()
+        chunks = self.metrics.get('dflow_chunks_total')
+        if chunks is not None:
+            out['chunks_per_second'] = chunks.total() / uptime if uptime else 0.0
+        return out
+
+    def start_http_server(self, port: int, host: str = 'localhost') -> ThreadingHTTPServer:
+        """serve the Prometheus text format on http://host:port/metrics"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') not in ('', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server
+
+
+# node-wide registry
+METRICS = MetricsRegistry()
+
+CHUNK_READ_SECONDS = METRICS.histogram('dflow_chunk_read_seconds', 'time to read and decode one chunk')
+CHUNK_EXEC_SECONDS = METRICS.histogram('dflow_chunk_exec_seconds', 'time the script spends on one chunk')
+DB_COMMIT_SECONDS = METRICS.histogram('dflow_db_commit_seconds', 'time of one batched database commit')
+CHUNKS_TOTAL = METRICS.counter('dflow_chunks_total', 'chunks processed, by DFlow and status')
+QUEUE_DEPTH = METRICS.gauge('dflow_queue_depth', 'pending chunks in the DFlow queue')
+CACHE_LOOKUPS = METRICS.counter('dflow_result_cache_total', 'result cache lookups, by result')
+SPECULATIVE_TOTAL = METRICS.counter('dflow_speculative_total', 'duplicate attempts of straggler chunks, by outcome')
+CHUNK_RETRIES = METRICS.counter('dflow_chunk_retries_total', 'error chunks put back in the queue')
+CHUNK_SPLITS = METRICS.counter('dflow_chunk_splits_total', 'governed chunks split for going over the memory limit')
+CHUNK_SPILLED_BYTES = METRICS.counter('dflow_spilled_bytes_total', 'governed script output written to temp files')
+PEER_BYTES = METRICS.counter('p2p_bytes_total', 'bytes exchanged with each peer, by direction')
+PEER_RTT_SECONDS = METRICS.histogram('p2p_message_rtt_seconds', 'request/response round trip per message type')
@@ -0,0 +1,309 @@
+import bisect
+import glob
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Union
+from compressedInput import CompressedInput, detect_codec
+from flexibleChunkReader import delimiter_bytes, scan_item_ends, scan_compressed_item_ends, parse_items
+from functions import get_file_hash
+from metrics import CHUNK_READ_SECONDS
+from setting import compressed_checkpoint_bytes, max_open_shards
+from storage import get_storage
+
+
+def is_multi_file_source(source: str) -> bool:
+    return os.path.isdir(source) or glob.has_magic(source)
+
+
+def source_exists(source: str) -> bool:
+    """cheap check that a directory, or the fixed base directory of a glob, is here"""
+    if not glob.has_magic(source):
+        return os.path.isdir(source)
+    base = []
+    for part in source.split(os.sep):
+        if glob.has_magic(part):
+            break
+        base.append(part)
+    return os.path.isdir(os.sep.join(base) or '.')
+
+
+def resolve_shards(source: str) -> List[str]:
+    """files of a directory (recursively) or a glob pattern, in a stable order"""
+    if os.path.isdir(source):
+        found = []
+        for root, dirs, files in os.walk(source):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            found.extend(os.path.join(root, name) for name in sorted(files) if not name.startswith('.'))
+        return found
+    return sorted(p for p in glob.glob(source, recursive=True) if os.path.isfile(p))
+
+
+def index_shard(filepath: str, items_per_chunk: int, mode: str, delimiter) -> dict:
+    """hash one shard and cut it into chunks, as byte bounds"""
+    stat = os.stat(filepath)
+    codec = detect_codec(filepath) if stat.st_size else None
+    compressed = CompressedInput(filepath, codec, compressed_checkpoint_bytes) if codec else None
+    shard = {
+        'filepath': filepath,
+        'file_size': stat.st_size,
+        'file_mtime': stat.st_mtime,
+        'content_hash': get_file_hash(filepath),
+        'codec': codec,
+        'checkpoints': [],
+        'total_items': 0,
+    }
+
+    if mode == 'byte':
+        if compressed:
+            for _ in compressed.scan():
+                pass
+        data_size = compressed.data_size if compressed else stat.st_size
+        shard['bounds'] = list(range(0, data_size, items_per_chunk)) + [data_size]
+    else:
+        if compressed:
+            ends = scan_compressed_item_ends(compressed, delimiter_bytes(mode, delimiter))
+        else:
+            ends = scan_item_ends(filepath, delimiter_bytes(mode, delimiter))
+        positions = [0] + ends
+        total_chunks = (len(ends) + items_per_chunk - 1) // items_per_chunk
+        shard['bounds'] = [positions[min(k * items_per_chunk, len(ends))] for k in range(total_chunks + 1)]
+        shard['total_items'] = len(ends)
+    if compressed:
+        shard['checkpoints'] = compressed.get_rows(stat.st_size)
+    shard['data_size'] = shard['bounds'][-1]
+    return shard
+
+
+class MultiFileChunkReader:
+    """
+    One chunk space over many shard files (a directory or a glob).
+    Chunks never cross shards; a global chunk number maps to
+    (shard, byte range) through the merged index in <hash>.db.
+    Shards are indexed in parallel and opened on demand, with at most
+    `max_open` of them open at once.
+    """
+
+    def __init__(self, source: str,
+                 items_per_chunk: int = 2048,
+                 delimiter: Union[str, bytes, None] = '\n',
+                 mode: str = 'line',
+                 index_hash: Optional[str] = None, # merged index of an earlier shard set
+                 index_workers: int = 8,
+                 max_open: int = max_open_shards):
+
+        if mode == 'columnar':
+            raise ValueError("columnar mode needs a single-file DFlow")
+        self.filepath = source
+        self.items_per_chunk = items_per_chunk
+        self.delimiter = '\n' if mode in ['line', 'csv'] else delimiter
+        self.mode = mode
+        self.chunking = 'fixed'
+        self.avg_chunk_bytes = 0
+        self.stale_chunks = []  # new shards only add chunks at the end
+        self.max_open = max(1, max_open)
+        self._open = OrderedDict()  # shard id -> open file or CompressedInput, LRU order
+        self._lock = threading.Lock()
+
+        paths = resolve_shards(source)
+        if not paths:
+            raise ValueError(f"no files match {source}")
+
+        previous = self._load_shards(index_hash) if index_hash else []
+        known = {s['filepath']: s for s in previous}
+        self.shards = [None] * len(paths)
+        todo = []
+        for i, path in enumerate(paths):
+            old = known.get(path)
+            stat = os.stat(path)
+            if old and old['file_size'] == stat.st_size and old['file_mtime'] == stat.st_mtime:
+                self.shards[i] = old
+            else:
+                todo.append(i)
+
+        if todo:
+            print(f"🔍 Indexing {len(todo)} of {len(paths)} shards ({mode} mode)...")
+            with ThreadPoolExecutor(max_workers=index_workers) as pool:
+                indexed = pool.map(lambda i: index_shard(paths[i], items_per_chunk, self.mode, self.delimiter), todo)
+                for i, shard in zip(todo, indexed):
+                    self.shards[i] = shard
+
+        hasher = hashlib.md5()
+        for shard in self.shards:
+            hasher.update(shard['content_hash'].encode('utf-8'))
+        self.content_hash = hasher.hexdigest()
+        self.hash = self.content_hash
+        old_hashes = [s['content_hash'] for s in previous]
+        if previous and [s['content_hash'] for s in self.shards[:len(previous)]] == old_hashes:
+            # same shards, or new ones after them: keep the index and the DFlow progress
+            self.hash = index_hash
+
+        self._setup_chunk_map()
+        self.db = get_storage(f"{self.hash}.db")
+        self.DBcreate_table()
+        if todo or self.hash != index_hash:
+            self._save_shards_DB()
+        print(f"✅ {len(self.shards)} shards, {self.total_items:,} items، {self.total_chunks} chunk")
+
+    def _setup_chunk_map(self):
+        self.first_chunks = []  # global number of each shard's first chunk
+        total = 0
+        for shard in self.shards:
+            self.first_chunks.append(total)
+            total += len(shard['bounds']) - 1
+        self.total_chunks = total
+        self.total_items = sum(s['total_items'] for s in self.shards)
+        self.file_size = sum(s['file_size'] for s in self.shards)
+
+    @property
+    def file_mtime(self) -> float:
+        return max(s['file_mtime'] for s in self.shards)
+
+    def DBcreate_table(self):
+        def create(cur):
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS shards (
+                id INTEGER PRIMARY KEY,
+                filepath TEXT NOT NULL,
+                file_size INTEGER NOT NULL,
+                file_mtime REAL NOT NULL,
+                content_hash TEXT NOT NULL,
+                codec TEXT,
+                total_items INTEGER NOT NULL
+            );
+            """)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS shard_bounds (
+                shard INTEGER NOT NULL,
+                id INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                PRIMARY KEY (shard, id)
+            );
+            """)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS shard_checkpoints (
+                shard INTEGER NOT NULL,
+                id INTEGER NOT NULL,
+                comp_offset INTEGER NOT NULL,
+                data_offset INTEGER NOT NULL,
+                PRIMARY KEY (shard, id)
+            );
+            """)
+        self.db.transaction(create)
+
+    def _load_shards(self, index_hash: str) -> list:
+        if not os.path.exists(f"{index_hash}.db"):
+            return []
+        db = get_storage(f"{index_hash}.db")
+        if db.query_one("SELECT name FROM sqlite_master WHERE type='table' AND name='shards';") is None:
+            return []
+        rows = db.query("SELECT id, filepath, file_size, file_mtime, content_hash, codec, total_items FROM shards ORDER BY id")
+        shards = [{'filepath': r[1], 'file_size': r[2], 'file_mtime': r[3], 'content_hash': r[4],
+                   'codec': r[5], 'total_items': r[6], 'bounds': [], 'checkpoints': []} for r in rows]
+        for shard_id, offset in db.query("SELECT shard, offset FROM shard_bounds ORDER BY shard, id"):
+            shards[shard_id]['bounds'].append(offset)
+        for shard_id, comp_offset, data_offset in db.query(
+                "SELECT shard, comp_offset, data_offset FROM shard_checkpoints ORDER BY shard, id"):
+            shards[shard_id]['checkpoints'].append((comp_offset, data_offset))
+        for shard in shards:
+            shard['data_size'] = shard['bounds'][-1] if shard['bounds'] else 0
+        return shards
+
+    def _save_shards_DB(self):
+        def save(cur):
+            cur.execute("DELETE FROM shards")
+            cur.execute("DELETE FROM shard_bounds")
+            cur.execute("DELETE FROM shard_checkpoints")
+            cur.executemany(
+                "INSERT INTO shards (id, filepath, file_size, file_mtime, content_hash, codec, total_items) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((i, s['filepath'], s['file_size'], s['file_mtime'], s['content_hash'], s['codec'], s['total_items'])
+                 for i, s in enumerate(self.shards))
+            )
+            cur.executemany(
+                "INSERT INTO shard_bounds (shard, id, offset) VALUES (?, ?, ?)",
+                ((i, idx, offset) for i, s in enumerate(self.shards) for idx, offset in enumerate(s['bounds']))
+            )
+            cur.executemany(
+                "INSERT INTO shard_checkpoints (shard, id, comp_offset, data_offset) VALUES (?, ?, ?, ?)",
+                ((i, idx, comp, data) for i, s in enumerate(self.shards) for idx, (comp, data) in enumerate(s['checkpoints']))
+            )
+        self.db.transaction(save)
+
+    def locate(self, chunk_index: int):
+        """(shard id, start byte, end byte) of a global chunk"""
+        shard_id = bisect.bisect_right(self.first_chunks, chunk_index) - 1
+        bounds = self.shards[shard_id]['bounds']
+        local = chunk_index - self.first_chunks[shard_id]
+        return shard_id, bounds[local], bounds[local + 1]
+
+    def _handle(self, shard_id: int):
+        """open shard, least recently used one closed past max_open"""
+        handle = self._open.get(shard_id)
+        if handle is not None:
+            self._open.move_to_end(shard_id)
+            return handle
+        shard = self.shards[shard_id]
+        if shard['codec']:
+            handle = CompressedInput(shard['filepath'], shard['codec'], compressed_checkpoint_bytes)
+            handle.set_rows(shard['checkpoints'])
+        else:
+            handle = open(shard['filepath'], 'rb')
+        self._open[shard_id] = handle
+        while len(self._open) > self.max_open:
+            _, old = self._open.popitem(last=False)
+            if not isinstance(old, CompressedInput):
+                old.close()
+        return handle
+
+    def read_chunk(self, chunk_index: int) -> Optional[str]:
+        if chunk_index < 0 or chunk_index >= self.total_chunks:
+            return None
+        shard_id, start, end = self.locate(chunk_index)
+        with self._lock:
+            handle = self._handle(shard_id)
+            if isinstance(handle, CompressedInput):
+                data = handle.read(start, end)
+            else:
+                handle.seek(start)
+                data = handle.read(end - start)
+        return data.decode('utf-8', errors='ignore')
+
+    def read_items(self, chunk_index: int) -> list:
+        start = time.perf_counter()
+        items = parse_items(self.read_chunk(chunk_index), self.mode, self.delimiter)
+        CHUNK_READ_SECONDS.observe(time.perf_counter() - start, mode=self.mode)
+        return items
+
+    def read_items_range(self, start: int, end: int) -> list:
+        raise ValueError("adaptive work units need a single-file DFlow")
+
+    def get_chunk_hash(self, chunk_index: int) -> Optional[str]:
+        chunk_data = self.read_chunk(chunk_index)
+        if chunk_data is None:
+            return None
+        return hashlib.md5(chunk_data.encode('utf-8')).hexdigest()
+
+    def get_file_info(self) -> dict:
+        return {
+            'filepath': self.filepath,
+            'file_size': self.file_size,
+            'mode': self.mode,
+            'delimiter': repr(self.delimiter),
+            'items_per_chunk': self.items_per_chunk,
+            'chunking': self.chunking,
+            'total_chunks': self.total_chunks,
+            'total_items': self.total_items,
+            'file_hash': self.hash,
+            'shards': len(self.shards),
+            'open_shards': len(self._open),
+        }
+
+    def close(self):
+        with self._lock:
+            for handle in self._open.values():
+                if not isinstance(handle, CompressedInput):
+                    handle.close()
+            self._open.clear()
@@ -5,9 +5,14 @@ from collections import defaultdict
 from time import sleep
 from flexibleChunkReader import FlexibleChunkReader
 import hashlib
+import time
+from metrics import METRICS, PEER_BYTES, PEER_RTT_SECONDS
+from chunkProfiler import get_profiler
 
 START_PORT = 5000
 END_PORT = 5060
+CLIENT_TIMEOUT = 10  # seconds an accepted connection may stall
+MAX_MESSAGE_BYTES = 256 * 1024 * 1024
 
 
 class P2PNode:
@@ -81,14 +86,20 @@ class P2PNode:
                 
     def _handle_client(self, client_socket, address):
         try:
-            data = client_socket.recv(4096).decode('utf-8')
+            # a peer that stalls mid-message must not hold this thread forever
+            client_socket.settimeout(CLIENT_TIMEOUT)
+            data = self._recv_msg(client_socket)
             if not data:
                 return
                 
-            message = json.loads(data)
+            message = json.loads(data.decode('utf-8'))
+            peer = message.get('address') or address[0]
+            PEER_BYTES.inc(len(data), peer=peer, direction='in')
             response = self._process_message(message)
             
-            client_socket.send(json.dumps(response).encode('utf-8'))
+            response_data = json.dumps(response).encode('utf-8')
+            self._send_msg(client_socket, response_data)
+            PEER_BYTES.inc(len(response_data), peer=peer, direction='out')
         except Exception as e:
             self.log(f"❌ Problem handling client!: {e}")
         finally:
@@ -135,6 +146,15 @@ class P2PNode:
         
         elif msg_type == 'PEER_PING':
             return {'status': 'ok'}
+
+        elif msg_type == 'METRICS':
+            return {'status': 'ok', 'metrics': METRICS.snapshot()}
+
+        elif msg_type == 'PROFILE':
+            profiler = get_profiler(message.get('file_hash', ''))
+            if profiler is None:
+                return {'status': 'not_found'}
+            return {'status': 'ok', 'profile': profiler.export()}
             
         return {'status': 'unknown_command'}
     
@@ -192,17 +212,65 @@ class P2PNode:
             
             client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             client.settimeout(timeout)
+            start = time.perf_counter()
             client.connect((host, port))
             
-            client.send(json.dumps(message).encode('utf-8'))
-            response = client.recv(4096).decode('utf-8')
+            request = json.dumps(message).encode('utf-8')
+            self._send_msg(client, request)
+            response = self._recv_msg(client)
             client.close()
+            PEER_RTT_SECONDS.observe(time.perf_counter() - start, type=message.get('type'))
+            PEER_BYTES.inc(len(request), peer=peer_addr, direction='out')
+            PEER_BYTES.inc(len(response), peer=peer_addr, direction='in')
             
-            return json.loads(response)
+            return json.loads(response.decode('utf-8'))
         except Exception as e:
             return None
     
     
+    def get_peer_metrics(self, peer_addr):
+        """metrics snapshot of another node"""
+        response = self._send_message(peer_addr, {'type': 'METRICS', 'address': f"{self.host}:{self.port}"}, 5)
+        if response and response.get('status') == 'ok':
+            return response.get('metrics')
+        return None
+
+    def get_peer_profile(self, peer_addr, file_hash):
+        """chunk profile another node collected for a DFlow"""
+        response = self._send_message(peer_addr, {'type': 'PROFILE', 'file_hash': file_hash,
+                                                  'address': f"{self.host}:{self.port}"}, 10)
+        if response and response.get('status') == 'ok':
+            return response.get('profile')
+        return None
+
+    # Messages are framed as a 4-byte big-endian length and the JSON payload.
+    # Nodes without the framing (a bare JSON request) cannot talk to this one.
+    def _send_msg(self, sock, data: bytes):
+        sock.sendall(len(data).to_bytes(4, 'big') + data)
+
+    def _recv_msg(self, sock) -> bytes:
+        """one framed message, b'' if the connection closed before it"""
+        header = self._recv_exact(sock, 4)
+        if not header:
+            return b''
+        size = int.from_bytes(header, 'big')
+        if size > MAX_MESSAGE_BYTES:
+            raise ValueError(f"message of {size} bytes is over the {MAX_MESSAGE_BYTES} limit")
+        data = self._recv_exact(sock, size)
+        if len(data) != size:
+            raise ConnectionError("connection closed mid-message")
+        return data
+
+    def _recv_exact(self, sock, size: int) -> bytes:
+        parts = []
+        while size:
+            part = sock.recv(min(size, 65536))
+            if not part:
+                break
+            parts.append(part)
+            size -= len(part)
+        return b''.join(parts)
+    
     def log(self, message, color = "white"):
 
         if(not self.nodeLog ): return
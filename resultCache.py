@@ -0,0 +1,135 @@
+import hashlib
+import json
+import marshal
+import time
+from typing import Union
+from metrics import CACHE_LOOKUPS
+from columnarCsv import json_default
+from memoryGovernor import SpilledOutput
+from storage import get_storage, write_blob
+
+
+def get_script_hash(script: str) -> str:
+    """hash of the compiled script, so formatting-only edits keep their cache"""
+    code = compile(script, '<dflow-script>', 'exec')
+    return hashlib.md5(marshal.dumps(code)).hexdigest()
+
+
+class ResultCache:
+    """node-wide results of (chunk content, script) pairs, LRU-bounded on disk"""
+
+    def __init__(self, db_file: str = 'result_cache.db', max_bytes: int = 256 * 1024 * 1024):
+        self.db_file = db_file
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # shared by the DFlows the scheduler runs side by side
+        self.db = get_storage(db_file)
+        self.DBcreate_table()
+        self.total_bytes = self._load_total_bytes()
+
+    def DBcreate_table(self):
+        def create(cur):
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                chunk_hash TEXT NOT NULL,
+                script_hash TEXT NOT NULL,
+                result BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (chunk_hash, script_hash)
+            );
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);")
+        self.db.transaction(create)
+
+    def _load_total_bytes(self) -> int:
+        return self.db.query_one("SELECT COALESCE(SUM(size), 0) FROM results")[0]
+
+    def get(self, chunk_hash: str, script_hash: str, raw: bool = False) -> Union[list, bytes, None]:
+        """the cached result, or its JSON bytes if `raw`"""
+        row = self.db.query_one(
+            "SELECT result FROM results WHERE chunk_hash = ? AND script_hash = ?",
+            (chunk_hash, script_hash)
+        )
+        if row is None:
+            self.misses += 1
+            CACHE_LOOKUPS.inc(result='miss')
+            return None
+        # LRU bookkeeping only, no need to wait for it
+        self.db.execute(
+            "UPDATE results SET last_used = ? WHERE chunk_hash = ? AND script_hash = ?",
+            (time.time(), chunk_hash, script_hash)
+        )
+        self.hits += 1
+        CACHE_LOOKUPS.inc(result='hit')
+        return row[0] if raw else json.loads(row[0])
+
+    def put(self, chunk_hash: str, script_hash: str, result: Union[list, bytes, SpilledOutput]):
+        # governed chunks hand over their result encoded, or still in their spill files
+        streamed = isinstance(result, SpilledOutput)
+        if streamed:
+            result_blob, size = None, result.size
+        else:
+            result_blob = result if isinstance(result, bytes) else json.dumps(result, default=json_default).encode("utf-8")
+            size = len(result_blob)
+        if size > self.max_bytes:
+            return
+
+        def store(cur):
+            # runs on the writer thread, which also serializes total_bytes
+            cur.execute(
+                "SELECT size FROM results WHERE chunk_hash = ? AND script_hash = ?",
+                (chunk_hash, script_hash)
+            )
+            row = cur.fetchone()
+            if row:
+                self.total_bytes -= row[0]
+            cur.execute(
+                """
+                INSERT OR REPLACE INTO results (chunk_hash, script_hash, result, size, last_used)
+                VALUES (?, ?, COALESCE(?, zeroblob(?)), ?, ?)
+                """,
+                (chunk_hash, script_hash, result_blob, size, size, time.time())
+            )
+            if streamed:
+                write_blob(cur, 'results', 'result', cur.lastrowid, result.write_to)
+            self.total_bytes += size
+            self._evict(cur)
+        self.db.transaction(store)
+
+    def _evict(self, cur):
+        """drop least recently used results until the cache fits max_bytes"""
+        while self.total_bytes > self.max_bytes:
+            cur.execute("SELECT chunk_hash, script_hash, size FROM results ORDER BY last_used LIMIT 64")
+            rows = cur.fetchall()
+            if not rows:
+                self.total_bytes = 0
+                return
+            for chunk_hash, script_hash, size in rows:
+                if self.total_bytes <= self.max_bytes:
+                    break
+                cur.execute(
+                    "DELETE FROM results WHERE chunk_hash = ? AND script_hash = ?",
+                    (chunk_hash, script_hash)
+                )
+                self.total_bytes -= size
+                self.evictions += 1
+
+    def clear(self):
+        def clear(cur):
+            cur.execute("DELETE FROM results")
+            self.total_bytes = 0
+        self.db.transaction(clear)
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'size_bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+        }
@@ -0,0 +1,137 @@
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Dict, Optional
+
+
+class _Job:
+    def __init__(self, name: str, weight: float, max_concurrency: int):
+        self.name = name
+        self.weight = max(weight, 0.001)
+        self.max_concurrency = max_concurrency
+        self.pending = deque()  # (future, fn, args, kwargs)
+        self.running = 0
+        self.served = 0
+        self.thread: Optional[threading.Thread] = None
+        self.state = 'queued'
+
+
+class _JobExecutor(Executor):
+    """what one job's run_parallel submits to; tasks wait for a fair-share slot"""
+
+    def __init__(self, scheduler: 'FairShareScheduler', job: _Job):
+        self.scheduler = scheduler
+        self.job = job
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        future = Future()
+        with self.scheduler._lock:
+            self.job.pending.append((future, fn, args, kwargs))
+        self.scheduler._dispatch()
+        return future
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        if cancel_futures:
+            with self.scheduler._lock:
+                for future, *_ in self.job.pending:
+                    future.cancel()
+                self.job.pending.clear()
+
+
+class FairShareScheduler:
+    """
+    One worker pool shared by all running DFlows of a node. A free worker
+    goes to the job with the fewest running tasks per unit of weight
+    (priority), skipping jobs at their concurrency cap.
+    """
+
+    def __init__(self, workers: int = 4):
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dflow-worker')
+        self.jobs: Dict[str, _Job] = {}
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def start(self, dflow, priority: float = 1.0, max_concurrency: Optional[int] = None) -> bool:
+        """run a DFlow in the background; returns at once"""
+        name = dflow.file_hash
+        with self._lock:
+            job = self.jobs.get(name)
+            if job and job.state == 'running':
+                return False
+            job = _Job(name, priority, max_concurrency or self.workers)
+            self.jobs[name] = job
+            job.state = 'running'
+
+        def run():
+            try:
+                # twice the cap in flight, so a freed worker always finds a queued task
+                dflow.run_parallel(workers=2 * job.max_concurrency, executor=_JobExecutor(self, job))
+                job.state = 'stopped' if dflow.stop_requested else 'done'
+            except Exception as e:
+                print(f"❌ DFlow {name[:8]} stopped: {e}")
+                job.state = 'failed'
+
+        job.thread = threading.Thread(target=run, name=f'dflow-{name[:8]}')
+        job.thread.daemon = True
+        job.thread.start()
+        return True
+
+    def set_priority(self, name: str, priority: Optional[float] = None, max_concurrency: Optional[int] = None):
+        with self._lock:
+            job = self.jobs.get(name)
+            if job is None:
+                return False
+            if priority is not None:
+                job.weight = max(priority, 0.001)
+            if max_concurrency is not None:
+                job.max_concurrency = max_concurrency
+        self._dispatch()
+        return True
+
+    def _dispatch(self):
+        """hand free workers to waiting tasks, fairest job first"""
+        while True:
+            with self._lock:
+                if self._running >= self.workers:
+                    return
+                candidates = [j for j in self.jobs.values()
+                              if j.pending and j.running < j.max_concurrency]
+                if not candidates:
+                    return
+                job = min(candidates, key=lambda j: (j.running / j.weight, j.served / j.weight))
+                future, fn, args, kwargs = job.pending.popleft()
+                if not future.set_running_or_notify_cancel():
+                    continue
+                job.running += 1
+                job.served += 1
+                self._running += 1
+            self.pool.submit(self._run_task, job, future, fn, args, kwargs)
+
+    def _run_task(self, job: _Job, future: Future, fn, args, kwargs):
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                job.running -= 1
+                self._running -= 1
+            self._dispatch()
+
+    def status(self) -> list:
+        with self._lock:
+            return [{
+                'file_hash': job.name,
+                'state': job.state,
+                'priority': job.weight,
+                'max_concurrency': job.max_concurrency,
+                'running': job.running,
+                'waiting': len(job.pending),
+                'served': job.served,
+            } for job in self.jobs.values()]
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
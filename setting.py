@@ -1,2 +1,11 @@
 Dflow_chunks_queue_limit = 20
-chunk_size = 4096
\ No newline at end of file
+chunk_size = 4096
+result_cache_max_bytes = 256 * 1024 * 1024
+metrics_http_port = 0 # 0 disables the Prometheus endpoint
+adaptive_target_seconds = (1.0, 5.0) # wanted run time of one work unit
+workers = 4 # script runs in parallel per DFlow
+compressed_checkpoint_bytes = 16 * 1024 * 1024 # uncompressed bytes between in-memory gzip restart points
+max_open_shards = 64 # open shard files per multi-file DFlow
+worker_memory_limit = 512 * 1024 * 1024 # RSS growth allowed per running governed chunk, 0 = no limit
+spill_threshold_bytes = 16 * 1024 * 1024 # governed script output kept in memory before it spills to a temp file
+stream_block_bytes = 1024 * 1024 # file bytes read at a time for the inputs of a governed chunk
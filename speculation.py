@@ -0,0 +1,82 @@
+import time
+from typing import Dict, List, Optional
+
+
+class StragglerMonitor:
+    """
+    Tracks how long chunk attempts take. Near the end of a DFlow, chunks
+    running longer than a percentile-based deadline are reported so they
+    can be duplicated on an idle worker.
+    """
+
+    def __init__(self, percentile: float = 0.9, factor: float = 1.5,
+                 min_samples: int = 5, min_deadline: float = 0.5):
+        self.percentile = percentile
+        self.factor = factor
+        self.min_samples = min_samples
+        self.min_deadline = min_deadline
+        self.durations: List[float] = []
+        self.started: Dict[int, float] = {}  # chunk_index -> first attempt start
+        self.duplicated: set = set()
+
+    def start(self, chunk_index: int):
+        self.started.setdefault(chunk_index, time.monotonic())
+
+    def finish(self, chunk_index: int, duration: Optional[float] = None):
+        self.started.pop(chunk_index, None)
+        self.duplicated.discard(chunk_index)
+        if duration is not None:
+            self.durations.append(duration)
+
+    def deadline(self) -> Optional[float]:
+        if len(self.durations) < self.min_samples:
+            return None
+        ordered = sorted(self.durations[-500:])
+        value = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+        return max(self.min_deadline, value * self.factor)
+
+    def stragglers(self) -> List[int]:
+        """in-flight chunks past the deadline that have no duplicate yet, slowest first"""
+        deadline = self.deadline()
+        if deadline is None:
+            return []
+        now = time.monotonic()
+        late = [(now - t, i) for i, t in self.started.items()
+                if now - t > deadline and i not in self.duplicated]
+        return [i for _, i in sorted(late, reverse=True)]
+
+    def mark_duplicated(self, chunk_index: int):
+        self.duplicated.add(chunk_index)
+
+
+class RetryPolicy:
+    """exponential backoff for chunks that ended in error"""
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempts: Dict[int, int] = {}
+        self.due: Dict[int, float] = {}  # chunk_index -> monotonic time it may run again
+
+    def schedule(self, chunk_index: int) -> bool:
+        """plan a retry; False once the chunk is out of retries"""
+        attempt = self.attempts.get(chunk_index, 0) + 1
+        if attempt > self.max_retries:
+            return False
+        self.attempts[chunk_index] = attempt
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        self.due[chunk_index] = time.monotonic() + delay
+        return True
+
+    def ready(self) -> List[int]:
+        now = time.monotonic()
+        ready = [i for i, t in self.due.items() if t <= now]
+        for i in ready:
+            del self.due[i]
+        return ready
+
+    def next_due_in(self) -> Optional[float]:
+        if not self.due:
+            return None
+        return max(0.0, min(self.due.values()) - time.monotonic())
@@ -0,0 +1,213 @@
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+from urllib.parse import quote
+from metrics import DB_COMMIT_SECONDS
+
+
+class Storage:
+    """
+    Access to one SQLite file for the whole node. Writes from any thread
+    are queued to a single writer thread, which commits them in batches;
+    reads use a read-only connection per thread (WAL mode), after the
+    writes queued so far are committed.
+    """
+
+    def __init__(self, path: str, batch_size: int = 500, max_queued: int = 10000):
+        self.path = os.path.abspath(path)  # the node may chdir later
+        self.name = os.path.basename(path)
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._submitted = 0
+        self._committed = 0
+        self._submit_lock = threading.Lock()
+        self._done = threading.Condition()
+        self._local = threading.local()
+        self._ready = threading.Event()
+        self._error: Optional[Exception] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._writer, name=f'db-{self.name}')
+        self._thread.daemon = True
+        self._thread.start()
+        self._ready.wait()
+        if self._error:
+            raise self._error
+
+    # ---- writer thread ----
+
+    def _writer(self):
+        try:
+            # transactions are explicit: one per batch, a savepoint per operation
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            conn.execute("PRAGMA busy_timeout=5000;")
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stop = True
+                batch = [op for op in batch if op is not None]
+
+            start = time.perf_counter()
+            cur = conn.cursor()
+            outcomes = []
+            try:
+                cur.execute("BEGIN")
+                for seq, op, future in batch:
+                    cur.execute("SAVEPOINT op")
+                    try:
+                        outcomes.append((future, op(cur), None))
+                    except Exception as e:
+                        # a failed operation leaves no partial writes in the batch
+                        cur.execute("ROLLBACK TO op")
+                        outcomes.append((future, None, e))
+                    cur.execute("RELEASE op")
+                cur.execute("COMMIT")
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                outcomes = [(future, None, e) for _, _, future in batch]
+            finally:
+                cur.close()
+            if batch:
+                DB_COMMIT_SECONDS.observe(time.perf_counter() - start, db=self.name)
+
+            for future, result, error in outcomes:
+                if future is None:
+                    if error is not None:
+                        print(f"❌ DB write failed ({self.name}): {error}")
+                elif error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+            with self._done:
+                if batch:
+                    self._committed = max(self._committed, batch[-1][0])
+                self._done.notify_all()
+        conn.close()
+
+    def _submit(self, op: Callable, future: Optional[Future]):
+        with self._submit_lock:
+            if self._closed:
+                raise RuntimeError(f"storage {self.name} is closed")
+            self._submitted += 1
+            # put under the lock, so the queue order follows the sequence numbers
+            self._queue.put((self._submitted, op, future))
+
+    # ---- writes ----
+
+    def execute(self, sql: str, params=()):
+        """queue one write; failures are reported, not raised"""
+        def op(cur):
+            cur.execute(sql, params)
+        self._submit(op, None)
+
+    def executemany(self, sql: str, rows):
+        rows = list(rows)
+        def op(cur):
+            cur.executemany(sql, rows)
+        self._submit(op, None)
+
+    def transaction(self, fn: Callable[[sqlite3.Cursor], object]):
+        """run fn(cursor) on the writer thread, committed with its batch; returns fn's result"""
+        future = Future()
+        self._submit(fn, future)
+        return future.result()
+
+    def flush(self):
+        """wait until everything queued so far is committed"""
+        target = self._submitted
+        with self._done:
+            while self._committed < target and self._thread.is_alive():
+                self._done.wait(0.5)
+
+    # ---- reads ----
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            uri = f"file:{quote(os.path.abspath(self.path))}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True)
+            conn.execute("PRAGMA busy_timeout=5000;")
+            self._local.conn = conn
+        return conn
+
+    def query(self, sql: str, params=()) -> list:
+        if self._committed < self._submitted:
+            self.flush()
+        cur = self._reader().cursor()
+        try:
+            cur.execute(sql, params)
+            return cur.fetchall()
+        finally:
+            cur.close()
+
+    def query_one(self, sql: str, params=()):
+        rows = self.query(sql, params)
+        return rows[0] if rows else None
+
+    def close(self):
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+
+_storages: Dict[str, Storage] = {}
+_storages_lock = threading.Lock()
+
+
+def write_blob(cur: sqlite3.Cursor, table: str, column: str, rowid: int, write: Callable):
+    """
+    stream a value into a blob set to zeroblob(n) beforehand; `write` gets
+    the blob as a file and must fill exactly its n bytes. Runs on the
+    writer thread, inside a transaction().
+    """
+    with cur.connection.blobopen(table, column, rowid) as blob:
+        write(blob)
+
+
+def get_storage(path: str) -> Storage:
+    """the node-wide Storage of a database file"""
+    key = os.path.abspath(path)
+    with _storages_lock:
+        storage = _storages.get(key)
+        if storage is None:
+            storage = _storages[key] = Storage(path)
+        return storage
+
+
+def close_storage(path: str):
+    with _storages_lock:
+        storage = _storages.pop(os.path.abspath(path), None)
+    if storage:
+        storage.close()
+
+
+@atexit.register
+def close_all_storages():
+    """commit the queued writes of every database, e.g. before exit"""
+    with _storages_lock:
+        storages = list(_storages.values())
+        _storages.clear()
+    for storage in storages:
+        storage.close()